@@ -0,0 +1,268 @@
+// Date-range filtering for the Distance and Time and CTL tabs, done in the
+// browser from the series main.update_client_series sends once per data
+// version. Figures are the server-built templates with their data swapped.
+
+(function () {
+    const DAY_MS = 86400000;
+    // About one point per horizontal pixel of the CTL graph
+    const MAX_POINTS = 1400;
+    const WEEKDAYS = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"];
+    const MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
+                    "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"];
+
+    function parseDay(text) {
+        // "YYYY-MM-DD..." -> UTC midnight in ms
+        const s = String(text).slice(0, 10).split("-");
+        return Date.UTC(+s[0], +s[1] - 1, +s[2]);
+    }
+
+    function dayBounds(column, startMs, from, to) {
+        // Index bounds [lo, hi) of the days from..to in a contiguous column
+        // starting at startMs
+        const n = column.length;
+        const lo = Math.max(0, Math.ceil((parseDay(from) - startMs) / DAY_MS));
+        const hi = Math.min(n, Math.floor((parseDay(to) - startMs) / DAY_MS) + 1);
+        return [lo, Math.max(lo, hi)];
+    }
+
+    function round(value, digits) {
+        const f = Math.pow(10, digits);
+        return Math.round(value * f) / f;
+    }
+
+    function template(series, name) {
+        // Copy the stored figure so Plotly never mutates it, and put back the
+        // theme that is sent once for all figures
+        const fig = JSON.parse(JSON.stringify(series.figures[name]));
+        fig.layout.template = series.theme;
+        return fig;
+    }
+
+    function emptyFigure(text) {
+        return {
+            data: [],
+            layout: {
+                annotations: [{
+                    text: text, xref: "paper", yref: "paper",
+                    x: 0.5, y: 0.5, showarrow: false,
+                }],
+            },
+        };
+    }
+
+    function bucketTotals(daily, lo, hi, keyOf) {
+        // Sums distance, seconds and TSS into ordered buckets keyed by
+        // keyOf(dayMs, index)
+        const start = parseDay(daily.start);
+        const keys = [];
+        const totals = {};
+        for (let i = lo; i < hi; i++) {
+            const key = keyOf(start + i * DAY_MS, i);
+            if (key === null) {
+                continue;
+            }
+            let t = totals[key];
+            if (t === undefined) {
+                t = totals[key] = {distance: 0, seconds: 0, tss: 0};
+                keys.push(key);
+            }
+            t.distance += daily.distance[i];
+            t.seconds += daily.seconds[i];
+            t.tss += daily.tss[i];
+        }
+        return {keys: keys, totals: totals};
+    }
+
+    function barAndLine(fig, x, distance, text, hours) {
+        fig.data[0].x = x;
+        fig.data[0].y = distance;
+        fig.data[0].text = text;
+        fig.data[1].x = x;
+        fig.data[1].y = hours;
+        return fig;
+    }
+
+    function annualFigure(series, lo, hi) {
+        const b = bucketTotals(series.daily, lo, hi,
+            (ms) => String(new Date(ms).getUTCFullYear()));
+        const distance = b.keys.map((k) => b.totals[k].distance);
+        return barAndLine(
+            template(series, "annual"), b.keys, distance,
+            distance.map((d) => Math.round(d)),
+            b.keys.map((k) => round(b.totals[k].seconds / 3600, 2)));
+    }
+
+    function yrmo(ms) {
+        const d = new Date(ms);
+        return String(d.getUTCFullYear() * 100 + d.getUTCMonth() + 1);
+    }
+
+    function monthlyFigure(series, lo, hi) {
+        const b = bucketTotals(series.daily, lo, hi, yrmo);
+        const distance = b.keys.map((k) => b.totals[k].distance);
+        return barAndLine(
+            template(series, "monthly"), b.keys, distance,
+            distance.map((d) => round(d, 1)),
+            b.keys.map((k) => round(b.totals[k].seconds / 3600, 2)));
+    }
+
+    function weekLabel(ms) {
+        const d = new Date(ms);
+        const day = String(d.getUTCDate()).padStart(2, "0");
+        return WEEKDAYS[d.getUTCDay()] + ", " + MONTHS[d.getUTCMonth()] + " " +
+            day + ", " + d.getUTCFullYear();
+    }
+
+    function weeklyFigure(series, lo, hi) {
+        // Monday-start weeks that had a ride, newest first
+        const daily = series.daily;
+        const b = bucketTotals(daily, lo, hi, (ms, i) => {
+            if (!daily.rides[i]) {
+                return null;
+            }
+            const monday = ms - ((new Date(ms).getUTCDay() + 6) % 7) * DAY_MS;
+            return weekLabel(monday);
+        });
+        b.keys.reverse();
+        const distance = b.keys.map((k) => round(b.totals[k].distance, 1));
+        const fig = barAndLine(
+            template(series, "weekly"), b.keys, distance, distance,
+            b.keys.map((k) => round(b.totals[k].seconds / 3600, 1)));
+        fig.layout.xaxis.nticks = Math.max(20, Math.min(b.keys.length, 52));
+        return fig;
+    }
+
+    function tssFigure(series, lo, hi) {
+        const b = bucketTotals(series.daily, lo, hi, yrmo);
+        const tss = b.keys.map((k) => b.totals[k].tss);
+        const fig = template(series, "tss");
+        fig.data[0].x = b.keys;
+        fig.data[0].y = tss;
+        fig.data[0].text = tss.map((t) => Math.trunc(t).toLocaleString("en-US"));
+        return fig;
+    }
+
+    function lttb(x, y, nOut) {
+        // Largest-Triangle-Three-Buckets, same as frontend/downsample.py
+        const n = y.length;
+        if (nOut >= n || nOut < 3) {
+            return y.map((_, i) => i);
+        }
+        const edges = [];
+        for (let i = 0; i < nOut - 1; i++) {
+            edges.push(Math.floor(1 + (i * (n - 2)) / (nOut - 2)));
+        }
+        const picked = [0];
+        let a = 0;
+        for (let i = 0; i < nOut - 2; i++) {
+            const lo = edges[i];
+            const hi = edges[i + 1];
+            const nextHi = i + 2 < edges.length ? edges[i + 2] : n;
+            let avgX = 0;
+            let avgY = 0;
+            for (let j = hi; j < nextHi; j++) {
+                avgX += x[j];
+                avgY += y[j];
+            }
+            avgX /= nextHi - hi;
+            avgY /= nextHi - hi;
+            let best = lo;
+            let bestArea = -1;
+            for (let j = lo; j < hi; j++) {
+                const area = Math.abs(
+                    (x[a] - avgX) * (y[j] - y[a]) - (x[a] - x[j]) * (avgY - y[a]));
+                if (area > bestArea) {
+                    bestArea = area;
+                    best = j;
+                }
+            }
+            a = best;
+            picked.push(a);
+        }
+        picked.push(n - 1);
+        return picked;
+    }
+
+    function ctlFigure(series, from, to, xRange) {
+        const fitness = series.fitness;
+        const fig = template(series, "ctl");
+        if (!fitness.start) {
+            return fig;
+        }
+        const startMs = parseDay(fitness.start);
+        const [lo, hi] = dayBounds(fitness.CTL, startMs, from, to);
+        const x = [];
+        for (let i = lo; i < hi; i++) {
+            x.push(startMs + i * DAY_MS);
+        }
+        ["CTL", "ATL", "TSB"].forEach((col, t) => {
+            const y = fitness[col].slice(lo, hi);
+            const keep = lttb(x, y, MAX_POINTS);
+            fig.data[t].x = keep.map((i) => new Date(x[i]).toISOString().slice(0, 10));
+            fig.data[t].y = keep.map((i) => y[i]);
+        });
+        if (xRange) {
+            fig.layout.xaxis = Object.assign(fig.layout.xaxis || {}, {range: xRange});
+        }
+        return fig;
+    }
+
+    function triggeredBy(prop) {
+        const ctx = window.dash_clientside.callback_context;
+        return ctx.triggered.some((t) => t.prop_id === prop);
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        cycling: {
+            distance_figures: function (from, to, series) {
+                const nothing = window.dash_clientside.no_update;
+                if (!series || !from || !to) {
+                    return [nothing, nothing, nothing];
+                }
+                const [lo, hi] = dayBounds(
+                    series.daily.distance, parseDay(series.daily.start), from, to);
+                if (lo >= hi) {
+                    const empty = emptyFigure(
+                        "No data available for the selected date range");
+                    return [empty, empty, empty];
+                }
+                return [
+                    annualFigure(series, lo, hi),
+                    monthlyFigure(series, lo, hi),
+                    weeklyFigure(series, lo, hi),
+                ];
+            },
+
+            ctl_figures: function (from, to, relayout, series) {
+                const nothing = window.dash_clientside.no_update;
+                if (!series || !from || !to) {
+                    return [nothing, nothing];
+                }
+                // A zoom re-renders only the CTL graph, at full resolution
+                // for the visible window; the TSS bars keep the picker range
+                if (triggeredBy("ctl-graph.relayoutData")) {
+                    relayout = relayout || {};
+                    let xRange = relayout["xaxis.range"];
+                    if (relayout["xaxis.range[0]"] !== undefined) {
+                        xRange = [relayout["xaxis.range[0]"], relayout["xaxis.range[1]"]];
+                    }
+                    if (xRange) {
+                        return [ctlFigure(series, xRange[0], xRange[1], xRange), nothing];
+                    }
+                    if (!relayout["xaxis.autorange"]) {
+                        return [nothing, nothing];
+                    }
+                    return [ctlFigure(series, from, to, null), nothing];
+                }
+                const [lo, hi] = dayBounds(
+                    series.daily.distance, parseDay(series.daily.start), from, to);
+                if (lo >= hi) {
+                    const empty = emptyFigure(
+                        "No data available for the selected date range");
+                    return [empty, empty];
+                }
+                return [ctlFigure(series, from, to, null), tssFigure(series, lo, hi)];
+            },
+        },
+    });
+})();
@@ -0,0 +1,73 @@
+import pandas as pd
+
+from backend.StageTimer import stage_timer
+
+
+@stage_timer.timed_methods
+class ActivitySchema:
+    """Compact dtypes for the in-memory activity frame. The store keeps rows
+    as they were ingested (dates and durations as text); this is applied
+    whenever they are loaded into a frame."""
+
+    # Local ride date; start_time keeps its UTC offset, so it is held in the
+    # zone the offsets came from
+    DATES = ["timestamp"]
+    TIMES = ["start_time"]
+    TIME_ZONE = "America/Denver"
+    # "H:MM:SS" text -> timedelta
+    DURATIONS = ["RidingTime", "PedalTime"]
+    # Few distinct strings repeated on every row
+    CATEGORIES = ["sport", "sub_sport", "week_num_yr"]
+    INTS = {"yr": "int16", "week_num": "int8", "mnth": "int8", "yrmo": "int32"}
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        # Safe to apply to a frame that is already typed. Other numeric columns
+        # go to float32 or the smallest integer type that holds them; anything
+        # else is left alone.
+        df = df.copy()
+        for col in df.columns:
+            values = df[col]
+            if col in self.DATES:
+                df[col] = self.parsed(
+                    values, pd.to_datetime(values, format="ISO8601", errors="coerce")
+                )
+            elif col in self.TIMES:
+                times = pd.to_datetime(
+                    values, format="ISO8601", utc=True, errors="coerce"
+                )
+                df[col] = self.parsed(values, times.dt.tz_convert(self.TIME_ZONE))
+            elif col in self.DURATIONS:
+                df[col] = self.parsed(values, pd.to_timedelta(values, errors="coerce"))
+            elif col == "PowerBalance":
+                df[col] = self.balance_right(values)
+            elif col in self.CATEGORIES:
+                df[col] = values.astype("category")
+            elif col in self.INTS and not values.isnull().any():
+                df[col] = values.astype(self.INTS[col])
+            elif pd.api.types.is_bool_dtype(values):
+                continue
+            elif pd.api.types.is_integer_dtype(values):
+                df[col] = pd.to_numeric(values, downcast="integer")
+            elif pd.api.types.is_float_dtype(values):
+                df[col] = values.astype("float32")
+        return df
+
+    def parsed(self, values: pd.Series, parsed: pd.Series) -> pd.Series:
+        # A column with any value that doesn't parse is kept as it was; the
+        # store's keys are built from start_time, so nothing may be lost
+        if (parsed.isnull() & values.notnull()).any():
+            return values
+        return parsed
+
+    def balance_right(self, values: pd.Series) -> pd.Series:
+        # "52% R | 48% L" -> 52.0, the right leg's share of power
+        if pd.api.types.is_numeric_dtype(values):
+            return values.astype("float32")
+        right = values.astype("string").str.extract(r"(\d+)% R", expand=False)
+        return pd.to_numeric(right).astype("float32")
+
+    def memory_report(self, df: pd.DataFrame) -> pd.DataFrame:
+        # Bytes per column (strings counted in full), largest first
+        usage = df.memory_usage(index=False, deep=True)
+        report = pd.DataFrame({"dtype": df.dtypes.astype(str), "bytes": usage})
+        return report.sort_values("bytes", ascending=False)
@@ -0,0 +1,318 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from backend.StageTimer import stage_timer
+
+
+def session_key(row: dict) -> str:
+    # Natural key for a session: its start time is unique per recorded ride, rows
+    # without one fall back to a hash of their content
+    if row.get("start_time") is not None:
+        return str(row["start_time"])
+    return "hash:" + row_hash(row)
+
+
+def row_hash(row: dict) -> str:
+    canonical = json.dumps(row, sort_keys=True, default=str)
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+@stage_timer.timed_methods
+class ActivityStore:
+    """Session rows stored as one Parquet file per year under ``store_path``,
+    plus an append-only log of sessions ingested since the last compaction."""
+
+    def __init__(self, store_path: str, compact_threshold: int = 500):
+        self.store_path = store_path
+        self.index_path = os.path.join(store_path, "session_index.json")
+        self.log_path = os.path.join(store_path, "rides.log")
+        self.compact_threshold = compact_threshold
+        self.index = None
+        self.lock = threading.RLock()
+
+    def partition_path(self, yr: int) -> str:
+        return os.path.join(self.store_path, f"yr={int(yr)}.parquet")
+
+    def years(self) -> List[int]:
+        if not os.path.isdir(self.store_path):
+            return []
+        return sorted(
+            int(f[len("yr=") : -len(".parquet")])
+            for f in os.listdir(self.store_path)
+            if f.startswith("yr=") and f.endswith(".parquet")
+        )
+
+    def is_empty(self) -> bool:
+        return not self.years() and not os.path.exists(self.log_path)
+
+    def version(self) -> str:
+        # Changes whenever an upsert appends to the log or a compaction
+        # rewrites a partition; cheap enough to call per request
+        parts = []
+        for f in [self.log_path] + [self.partition_path(yr) for yr in self.years()]:
+            if os.path.exists(f):
+                stat = os.stat(f)
+                parts.append(f"{os.path.basename(f)}:{stat.st_size}:{stat.st_mtime_ns}")
+        return hashlib.sha1("|".join(parts).encode()).hexdigest()[:16]
+
+    def read_log(self) -> List[dict]:
+        if not os.path.exists(self.log_path):
+            return []
+        records = []
+        with open(self.log_path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Torn final line from a crash mid-append; the batch it
+                    # belonged to was never acknowledged, so drop it
+                    continue
+        return records
+
+    def read_base(
+        self, columns: Optional[List[str]] = None, years: Optional[List[int]] = None
+    ) -> pd.DataFrame:
+        wanted = (
+            self.years() if years is None else sorted(set(years) & set(self.years()))
+        )
+        frames = []
+        for yr in wanted:
+            path = self.partition_path(yr)
+            if columns is not None:
+                available = pq.read_schema(path).names
+                table = pq.read_table(
+                    path, columns=[c for c in columns if c in available]
+                )
+            else:
+                table = pq.read_table(path)
+            frames.append(table.to_pandas())
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True)
+
+    def read(
+        self, columns: Optional[List[str]] = None, years: Optional[List[int]] = None
+    ) -> pd.DataFrame:
+        with self.lock:
+            logged = {}
+            for record in self.read_log():
+                logged[record["key"]] = record
+            if not logged:
+                return self.read_base(columns=columns, years=years)
+
+            # Log entries supersede base rows with the same key, so the key
+            # column has to be read even if the caller didn't ask for it
+            base_columns = columns
+            if columns is not None and "start_time" not in columns:
+                base_columns = columns + ["start_time"]
+            base = self.read_base(columns=base_columns, years=years)
+            if not base.empty:
+                base = base[~self.frame_keys(base).isin(logged.keys())]
+                if base_columns is not columns:
+                    base = base.drop(columns=["start_time"])
+
+            log_rows = [
+                record["row"]
+                for record in logged.values()
+                if years is None or record["yr"] in years
+            ]
+            log_df = pd.DataFrame(log_rows)
+            if columns is not None:
+                log_df = log_df[[c for c in columns if c in log_df.columns]]
+            frames = [df for df in (base, log_df) if not df.empty]
+            if not frames:
+                return pd.DataFrame(columns=columns)
+            return pd.concat(frames, ignore_index=True)
+
+    def to_table(self, df: pd.DataFrame) -> pa.Table:
+        # Object columns holding mixed python types (e.g. an enum that decoded
+        # as an int in one file and a string in another) are stored as strings
+        df = df.copy()
+        for col in df.columns[df.dtypes == object]:
+            try:
+                pa.array(df[col], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                df[col] = df[col].map(lambda v: v if v is None else str(v))
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+    def write_partition(self, yr: int, df: pd.DataFrame) -> None:
+        os.makedirs(self.store_path, exist_ok=True)
+        path = self.partition_path(yr)
+        tmp_path = path + ".tmp"
+        pq.write_table(self.to_table(df), tmp_path)
+        os.replace(tmp_path, path)
+
+    def frame_keys(self, df: pd.DataFrame) -> pd.Series:
+        if "start_time" not in df.columns:
+            df = df.assign(start_time=None)
+        keys = df["start_time"].astype(str)
+        missing = df["start_time"].isnull()
+        for i in df.index[missing]:
+            keys[i] = session_key(df.loc[i].dropna().to_dict())
+        return keys
+
+    def partition_counts(self) -> Dict[str, int]:
+        return {
+            str(yr): pq.read_metadata(self.partition_path(yr)).num_rows
+            for yr in self.years()
+        }
+
+    def load_index(self) -> Dict[str, list]:
+        # session_key -> [yr, row hash]. The saved copy describes the Parquet
+        # base and is trusted only when its per-year row counts still match the
+        # footers; log entries are replayed on top of it.
+        if self.index is not None:
+            return self.index
+
+        index = None
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                saved = json.load(f)
+            if saved.get("counts") == self.partition_counts():
+                index = saved["keys"]
+
+        if index is None:
+            print("Rebuilding session index...")
+            index = {}
+            for yr in self.years():
+                # Hashes of rows read back from Parquet differ from freshly decoded
+                # ones, so they are left unknown and the next re-ingest replaces them
+                for key in self.frame_keys(self.read_base(years=[yr])):
+                    index[key] = [yr, None]
+            self.index = index
+            self.save_index()
+
+        for record in self.read_log():
+            index[record["key"]] = [record["yr"], record["hash"]]
+        self.index = index
+        return self.index
+
+    def unload(self) -> None:
+        # Rebuilt from the saved index and the log on next use
+        with self.lock:
+            self.index = None
+
+    def save_index(self) -> None:
+        os.makedirs(self.store_path, exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"counts": self.partition_counts(), "keys": self.index}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def upsert(self, rows: list) -> int:
+        # Merge policy: an unknown key is appended, a known key with the same
+        # hash is a duplicate and dropped, a known key whose content changed
+        # (e.g. a re-exported file) supersedes the stored row. Accepted rows
+        # go to the log as one fsync'd append; the Parquet base is untouched
+        # until compact().
+        with self.lock:
+            index = self.load_index()
+            lines = []
+            for row in rows:
+                key = session_key(row)
+                digest = row_hash(row)
+                entry = index.get(key)
+                if entry is not None and entry[1] == digest:
+                    continue
+                record = {"key": key, "hash": digest, "yr": int(row["yr"]), "row": row}
+                lines.append(json.dumps(record, default=str) + "\n")
+                index[key] = [record["yr"], digest]
+
+            if lines:
+                os.makedirs(self.store_path, exist_ok=True)
+                self.truncate_torn_line()
+                with open(self.log_path, "a") as f:
+                    f.write("".join(lines))
+                    f.flush()
+                    os.fsync(f.fileno())
+            return len(lines)
+
+    def truncate_torn_line(self) -> None:
+        # A crash mid-append leaves a partial last line; appending straight
+        # onto it would corrupt the next batch's first record too. Cut the
+        # log back to its last newline (the torn batch was never acknowledged).
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "r+b") as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(0, position - 65536)
+                f.seek(start)
+                block = f.read(position - start)
+                newline = block.rfind(b"\n")
+                if newline != -1:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position != end:
+                print(f"Dropping {end - position} bytes of a torn log line")
+                f.truncate(position)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def needs_compaction(self) -> bool:
+        return len(self.read_log()) >= self.compact_threshold
+
+    def compact(self) -> int:
+        # Fold the log into the year partitions it touches, then drop the log.
+        # Replaying a log against partitions that already contain it is
+        # idempotent, so a crash between the two steps loses nothing.
+        with self.lock:
+            self.load_index()
+            logged = {}
+            for record in self.read_log():
+                logged[record["key"]] = record
+            if not logged:
+                return 0
+
+            by_year = {}
+            for key, record in logged.items():
+                by_year.setdefault(record["yr"], {})[key] = record["row"]
+            # A re-exported row may have moved year, so every partition gets
+            # the superseded keys dropped, not only the ones being appended to
+            for yr in self.years():
+                existing = self.read_base(years=[yr])
+                keep = existing[~self.frame_keys(existing).isin(logged.keys())]
+                if yr not in by_year and len(keep) == len(existing):
+                    continue
+                new_rows = pd.DataFrame(list(by_year.pop(yr, {}).values()))
+                frames = [df for df in (keep, new_rows) if not df.empty]
+                if frames:
+                    self.write_partition(yr, pd.concat(frames, ignore_index=True))
+                else:
+                    os.remove(self.partition_path(yr))
+            for yr, rows in by_year.items():
+                self.write_partition(yr, pd.DataFrame(list(rows.values())))
+
+            self.save_index()
+            os.remove(self.log_path)
+            self.prune_temp_files()
+            return len(logged)
+
+    def prune_temp_files(self) -> None:
+        # Partitions or indexes left half-written by an interrupted write
+        for f in os.listdir(self.store_path):
+            if f.endswith(".tmp"):
+                os.remove(os.path.join(self.store_path, f))
+
+    def replace_all(self, rows: list) -> None:
+        with self.lock:
+            df = pd.DataFrame(rows)
+            for yr in self.years():
+                os.remove(self.partition_path(yr))
+            if os.path.exists(self.log_path):
+                os.remove(self.log_path)
+            for yr, part in df.groupby("yr", sort=True):
+                self.write_partition(yr, part.reset_index(drop=True))
+            self.index = {}
+            for row in rows:
+                self.index[session_key(row)] = [int(row["yr"]), row_hash(row)]
+            self.save_index()
@@ -0,0 +1,105 @@
+import io
+from datetime import datetime
+from typing import Tuple
+
+import pandas as pd
+import pyarrow as pa
+from flask import Flask, Response, abort, request
+
+from backend.AggregateCache import AggregateCache
+from backend.Athlete import Athlete
+from backend.AthleteRegistry import AthleteRegistry
+from backend.PrefixSums import PrefixSums
+from backend.StageTimer import stage_timer
+
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+GRANULARITIES = ("annual", "monthly", "weekly", "daily", "weekly_summary")
+
+
+@stage_timer.timed_methods
+class AggregateApi:
+    """Read-only HTTP access to the dashboard's aggregations:
+
+        GET /api/aggregates/<granularity>?athlete=&start=YYYY-MM-DD&end=YYYY-MM-DD&format=json|arrow
+
+    Responses carry the athlete's data version as their ETag, so a client
+    sending it back in If-None-Match gets a bodiless 304 until new rides are
+    ingested. Encoded bodies are cached per version and query."""
+
+    def __init__(self, registry: AthleteRegistry, maxsize: int = 64):
+        self.registry = registry
+        self.cache = AggregateCache(maxsize=maxsize)
+
+    def register(self, server: Flask) -> None:
+        server.add_url_rule(
+            "/api/aggregates/<granularity>", "aggregates", self.aggregates
+        )
+
+    def aggregate(
+        self, athlete: Athlete, views: dict, granularity: str, start: str, end: str
+    ) -> pd.DataFrame:
+        processor = athlete.processor
+        if "daily_df" not in views:
+            return pd.DataFrame()
+        if granularity == "weekly_summary":
+            # Needs the per-ride rows, not the daily totals; days without a
+            # ride add nothing, so no calendar is merged in
+            rides = views["all_data_df"]
+            days = pd.to_datetime(rides["timestamp"])
+            rides = rides[(days >= start) & (days <= end)]
+            return processor.weekly_summary_rides(rides).reset_index()
+        sums = PrefixSums(views["daily_cumsum"])
+        if granularity == "annual":
+            return processor.get_annual_data(sums, start, end)
+        if granularity == "monthly":
+            return processor.get_monthly_data(sums, start, end)
+        if granularity == "weekly":
+            return processor.get_weekly_totals(sums, start_dt=start, end_dt=end)
+        daily = processor.daily_slice(views["daily_df"], start, end)
+        # The daily table is indexed by the same "date" this adds as a column
+        return processor.get_daily_data(daily.reset_index(drop=True))
+
+    def encode(self, df: pd.DataFrame, fmt: str) -> Tuple[bytes, str]:
+        if fmt == "arrow":
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            sink = io.BytesIO()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return sink.getvalue(), ARROW_MIMETYPE
+        body = df.to_json(orient="split", index=False, date_format="iso")
+        return body.encode(), "application/json"
+
+    def aggregates(self, granularity: str) -> Response:
+        # Local tools only, like /_stats
+        if request.remote_addr not in ("127.0.0.1", "::1"):
+            abort(403)
+        if granularity not in GRANULARITIES:
+            abort(404)
+        fmt = request.args.get("format", "json")
+        if fmt not in ("json", "arrow"):
+            abort(400, "format must be json or arrow")
+        start = request.args.get("start", "1900-01-01")
+        end = request.args.get("end", str(datetime.now().date()))
+        try:
+            start, end = (pd.Timestamp(d).strftime("%Y-%m-%d") for d in (start, end))
+        except ValueError:
+            abort(400, "start and end must be dates")
+
+        athlete = self.registry.get(request.args.get("athlete"))
+        # The tag names the version of the frames the body is built from
+        views = self.registry.views(athlete.id)
+        etag = f"{athlete.id}-{views['data_version']}"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            key = (athlete.id, views["data_version"], granularity, start, end, fmt)
+            cached = self.cache.get(key)
+            if cached is None:
+                df = self.aggregate(athlete, views, granularity, start, end)
+                cached = self.encode(df, fmt)
+                self.cache.put(key, cached)
+            response = Response(cached[0], mimetype=cached[1])
+        response.set_etag(etag)
+        # Clients may keep the body but should revalidate before using it
+        response.headers["Cache-Control"] = "no-cache"
+        return response
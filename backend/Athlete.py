@@ -0,0 +1,249 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from threading import Thread
+from typing import Optional
+
+import pandas as pd
+
+from backend.CyclingDataProcessor import CyclingDataProcessor
+from backend.FitnessEngine import FitnessEngine
+from backend.PowerCurveEngine import PowerCurveEngine
+from backend.PrefixSums import PrefixSums
+from backend.SnapshotStore import SnapshotStore, snapshot_mode
+from backend.StageTimer import stage_timer
+
+
+@stage_timer.timed_methods
+class Athlete:
+    """One rider's storage and engines, plus (while loaded) the frames the
+    dashboard reads. unload() drops the frames and the engines' in-memory
+    caches, which are read back from disk on next use; ingest keeps working
+    for athletes that aren't loaded."""
+
+    def __init__(
+        self,
+        athlete_id: str,
+        name: str,
+        download_path: Optional[str] = None,
+        data_files_path: Optional[str] = None,
+    ):
+        self.id = athlete_id
+        self.name = name
+        self.processor = CyclingDataProcessor(download_path, data_files_path)
+
+        # Keep per-second records so power curves can be built from them
+        self.processor.record_ingest = True
+        self.power_curves = PowerCurveEngine(
+            self.processor.records,
+            os.path.join(self.processor.data_files_path, "power_curves"),
+        )
+        self.fitness = FitnessEngine(
+            os.path.join(self.processor.data_files_path, "fitness.parquet")
+        )
+
+        # Running totals of the daily table, extended from the first changed
+        # day like the fitness series
+        self.prefix_sums = PrefixSums()
+
+        # Published by the ingest process and mapped by serving workers when
+        # running with several of them (see SnapshotStore)
+        self.snapshot_mode = snapshot_mode()
+        self.snapshots = SnapshotStore(
+            os.path.join(self.processor.data_files_path, "snapshots")
+        )
+        self.snapshot_checked = 0.0
+
+        # Serialises ingest, loading and view building for this athlete
+        self.lock = threading.RLock()
+        # Derived frames, replaced as a whole so readers never see a mix of
+        # versions; None while unloaded. The store version they were built
+        # from travels with them as views["data_version"].
+        self.views = None
+        self.views_bytes = 0
+        # Shown in the header until this athlete's first ingest is done
+        self.status = {"state": "loading", "message": "Loading stored rides..."}
+
+    @property
+    def loaded(self) -> bool:
+        return self.views is not None
+
+    def load(self) -> dict:
+        if self.snapshot_mode == "read":
+            return self.load_snapshot()
+        # Loaded views are returned without the lock, which an ingest may be
+        # holding for a while
+        views = self.views
+        if views is not None:
+            return views
+        with self.lock:
+            if self.views is None:
+                self.set_views(self.build_views(self.processor.load_activities()))
+            return self.views
+
+    def load_snapshot(self) -> dict:
+        # Serving workers never build frames: they map whatever the ingest
+        # process last published, looking for a newer version at most once a
+        # second
+        views = self.views
+        now = time.monotonic()
+        if views is not None and now - self.snapshot_checked < 1:
+            return views
+        with self.lock:
+            self.snapshot_checked = now
+            version = self.snapshots.current_version()
+            if version is None:
+                self.status = {
+                    "state": "loading",
+                    "message": "Waiting for the ingest process...",
+                }
+                if self.views is None:
+                    self.views = {"all_data_df": pd.DataFrame(), "data_version": None}
+            elif self.views is None or version != self.views["data_version"]:
+                views = self.snapshots.read(version)
+                views["data_version"] = version
+                self.set_views(views)
+                # Curves cached for the old version may have been superseded
+                self.power_curves.unload()
+                self.status = {"state": "ready", "message": "Up to date"}
+            return self.views
+
+    def unload(self, blocking: bool = True) -> bool:
+        # Returns False without waiting when blocking is off and the lock is
+        # held, e.g. by an ingest
+        if not self.lock.acquire(blocking=blocking):
+            return False
+        try:
+            self.views = None
+            self.views_bytes = 0
+            self.unload_caches()
+        finally:
+            self.lock.release()
+        return True
+
+    def unload_caches(self) -> None:
+        # Everything here is rebuilt lazily from disk; the running totals
+        # start over on the next build_views
+        self.power_curves.unload()
+        self.fitness.unload()
+        self.prefix_sums = PrefixSums()
+        self.processor.store.unload()
+        self.processor.records.unload()
+
+    def set_views(self, views: dict) -> None:
+        # Sized once here; deep memory usage is too slow to take per request
+        self.views_bytes = sum(
+            int(frame.memory_usage(index=True, deep=True).sum())
+            for frame in views.values()
+            if isinstance(frame, pd.DataFrame)
+        )
+        self.views = views
+        if self.snapshot_mode == "publish":
+            self.snapshots.publish(views, views["data_version"])
+
+    def memory_bytes(self) -> int:
+        # The fitness series and running totals are counted as views; the
+        # daily values kept beside the totals and computed curves are not
+        daily_values = self.prefix_sums.daily_values
+        return (
+            self.views_bytes
+            + (0 if daily_values is None else daily_values.nbytes)
+            + self.power_curves.memory_bytes()
+        )
+
+    def build_views(self, all_data_df: pd.DataFrame) -> dict:
+        # Derive every frame the callbacks read and publish a new data version
+        # so open pages repaint. Nothing is derived until there are rides.
+        processor = self.processor
+        views = {"all_data_df": all_data_df, "data_version": processor.store.version()}
+        if all_data_df.empty:
+            return views
+
+        # Daily calendar table the date-range views slice into
+        daily_df = processor.create_daily_table(all_data_df)
+        views["daily_df"] = daily_df
+        self.prefix_sums.update(daily_df)
+        views["daily_cumsum"] = self.prefix_sums.cumulative
+
+        # Fitness/fatigue/form over the full history, extended from the first
+        # changed day
+        self.fitness.update(daily_df["training_stress_score"])
+        views["fitness"] = self.fitness.load()
+
+        timestamps = pd.to_datetime(all_data_df["timestamp"])
+        print(
+            f"{self.name}: data range {timestamps.min():%Y-%m-%d} "
+            f"to {timestamps.max():%Y-%m-%d}"
+        )
+
+        # Last month of days, merged with the rides on them
+        current_month_start = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
+        current_month_end = str(datetime.now().date())
+        recent_date_range = processor.create_future_dates_df(
+            current_month_start, current_month_end
+        )
+        recent_merged_df = processor.merge_dataframes(recent_date_range, all_data_df)
+        views["recent_merged_df"] = recent_merged_df
+
+        # Create the specific dataframes for visualizations
+        views["recent_rides"] = processor.weekly_summary_rides(recent_merged_df)
+        views["last14rides"] = processor.last14rides(recent_merged_df)
+        # The typed frame has real dates, so the latest ride comes straight
+        # from it
+        views["latest_ride_metrics"] = processor.get_latest_ride_metrics(all_data_df)
+        return views
+
+    def ingest_new_files(self) -> list:
+        # Decode whatever is new in the download folder into the store
+        with self.lock:
+            processor = self.processor
+            print(f"{self.name}: processing new files...")
+            new_data = processor.process_new_files()
+            if new_data:
+                processor.write_out_file(new_data)
+                print(f"{self.name}: processed {len(new_data)} new files")
+            else:
+                print(f"{self.name}: no new files to process")
+            processor.commit_manifest()
+            new_curves = self.power_curves.update()
+            if new_curves:
+                print(f"{self.name}: computed power curves for {new_curves} rides")
+
+            # Fold the ride log into the Parquet base once it has grown, off
+            # the ingest thread
+            if processor.store.needs_compaction():
+                Thread(target=processor.compact, daemon=True).start()
+
+            # Merge new rides into loaded frames rather than re-reading the
+            # whole store; unloaded athletes pick them up on their next load
+            if new_data and self.views is not None:
+                all_data_df = processor.merge_rows(self.views["all_data_df"], new_data)
+                self.set_views(self.build_views(all_data_df))
+            return new_data
+
+    def ingest(self) -> bool:
+        # A full pass for this athlete: move any legacy JSON history into the
+        # store, then ingest the download folder. Returns False when another
+        # process holds this athlete's ingest lock.
+        if not self.processor.acquire_ingest_lock():
+            self.status = {"state": "ready", "message": "Another process is ingesting"}
+            return False
+        self.status = {"state": "ingesting", "message": "Checking for new rides..."}
+        try:
+            with self.lock:
+                was_empty = self.processor.store.is_empty()
+                self.processor.migrate_json_snapshots()
+                if was_empty and not self.processor.store.is_empty() and self.loaded:
+                    self.set_views(self.build_views(self.processor.load_activities()))
+                self.ingest_new_files()
+                if not self.loaded:
+                    # Ingest reads the indexes and computes curves; don't
+                    # hold them for an athlete nobody is viewing
+                    self.unload_caches()
+            self.status = {"state": "ready", "message": "Up to date"}
+            return True
+        except Exception as e:
+            print(f"{self.name}: error in ingest: {str(e)}")
+            self.status = {"state": "error", "message": f"Ingest failed: {str(e)}"}
+            return False
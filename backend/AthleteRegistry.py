@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from backend.Athlete import Athlete
+
+# Path of the athletes JSON file; without it the original single rider is
+# served from the processor's built-in paths
+ATHLETES_ENV = "CYCLING_DASH_ATHLETES"
+DEFAULT_MEMORY_BUDGET_MB = 1024
+
+
+class AthleteRegistry:
+    """The athletes this process serves and which of them are loaded.
+
+    The config file looks like::
+
+        {
+            "memory_budget_mb": 512,
+            "athletes": [
+                {"id": "tyler", "name": "Tyler", "download_path": "/srv/uploads/tyler"},
+                {"id": "sam", "name": "Sam", "download_path": "...", "data_path": "..."}
+            ]
+        }
+
+    ``data_path`` defaults to athletes/<id> next to the config file, so every
+    athlete's store, records, fitness series and power curves are kept apart.
+    Athletes load on first use; loading one that takes the loaded frames past
+    the memory budget unloads the least recently used others."""
+
+    def __init__(self, config_path: Optional[str] = None):
+        config_path = config_path or os.environ.get(ATHLETES_ENV)
+        config = {}
+        if config_path:
+            with open(config_path) as f:
+                config = json.load(f)
+
+        self.athletes = OrderedDict()
+        root = os.path.dirname(os.path.abspath(config_path)) if config_path else ""
+        for entry in config.get("athletes", []):
+            athlete_id = str(entry["id"])
+            data_path = entry.get("data_path") or os.path.join(
+                root, "athletes", athlete_id
+            )
+            self.athletes[athlete_id] = Athlete(
+                athlete_id,
+                entry.get("name", athlete_id),
+                download_path=os.path.join(entry["download_path"], ""),
+                data_files_path=os.path.join(data_path, ""),
+            )
+        if not self.athletes:
+            self.athletes["default"] = Athlete("default", "Me")
+
+        self.memory_budget = (
+            config.get("memory_budget_mb", DEFAULT_MEMORY_BUDGET_MB) * 2**20
+        )
+        # Loaded athlete ids, least recently used first
+        self.recent = OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def default_id(self) -> str:
+        return next(iter(self.athletes))
+
+    def options(self) -> List[Dict[str, str]]:
+        return [
+            {"label": athlete.name, "value": athlete.id}
+            for athlete in self.athletes.values()
+        ]
+
+    def get(self, athlete_id: Optional[str]) -> Athlete:
+        # Unknown or missing ids (an old page, a removed rider) fall back to
+        # the first athlete
+        return self.athletes.get(athlete_id) or self.athletes[self.default_id]
+
+    def views(self, athlete_id: Optional[str]) -> dict:
+        # The athlete's frames, loading them if needed and evicting others
+        # to stay within the memory budget
+        athlete = self.get(athlete_id)
+        views = athlete.load()
+        with self.lock:
+            self.recent[athlete.id] = True
+            self.recent.move_to_end(athlete.id)
+            evicted = self.evict(keep=athlete.id)
+        # Unloaded outside the registry lock: an athlete mid-ingest holds its
+        # own lock for the whole pass and is skipped rather than waited for
+        for other in evicted:
+            if other.unload(blocking=False):
+                with self.lock:
+                    self.recent.pop(other.id, None)
+                print(f"Unloaded {other.name} to stay within the memory budget")
+        return views
+
+    def evict(self, keep: str) -> List[Athlete]:
+        # Called with the lock held; picks the least recently used athletes
+        # to unload. The athlete being served is never evicted.
+        loaded = [self.athletes[i] for i in self.recent if self.athletes[i].loaded]
+        total = sum(athlete.memory_bytes() for athlete in loaded)
+        evicted = []
+        for athlete in loaded:
+            if total <= self.memory_budget:
+                break
+            if athlete.id == keep:
+                continue
+            total -= athlete.memory_bytes()
+            evicted.append(athlete)
+        return evicted
+
+    def stats(self) -> dict:
+        with self.lock:
+            loaded = {
+                i: self.athletes[i].memory_bytes()
+                for i in self.recent
+                if self.athletes[i].loaded
+            }
+            views = {i: self.athletes[i].views for i in loaded}
+        # Per-column bytes of each loaded activity frame, taken outside the
+        # lock since deep sizing walks every string
+        activity_frame_bytes = {}
+        for i, athlete_views in views.items():
+            if athlete_views is not None:
+                report = self.athletes[i].processor.schema.memory_report(
+                    athlete_views["all_data_df"]
+                )
+                activity_frame_bytes[i] = report["bytes"].to_dict()
+        return {
+            "athletes": len(self.athletes),
+            "loaded": loaded,
+            "loaded_bytes": sum(loaded.values()),
+            "memory_budget_bytes": self.memory_budget,
+            "activity_frame_bytes": activity_frame_bytes,
+        }
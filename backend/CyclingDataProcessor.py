@@ -1,118 +1,603 @@
 import datetime
+import gzip
+import hashlib
+import io
 import json
 import logging
+import multiprocessing
 import os
-from datetime import date, datetime, timedelta
-from typing import Dict, List, Optional, Tuple, Union
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice, repeat
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+import zipfile
+import zlib
 from zipfile import ZipFile
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 import numpy as np
 import pandas as pd
 from dateutil import tz
 from garmin_fit_sdk import Decoder, Stream
 from pytz import timezone
 
+from backend.ActivitySchema import ActivitySchema
+from backend.ActivityStore import ActivityStore, row_hash, session_key
+from backend.PrefixSums import PrefixSums
+from backend.RecordStore import RecordStore, records_to_columns
+from backend.StageTimer import stage_timer
+
+# Running-total column -> column name in the current month weekly summary
+WEEKLY_SUMMARY_COLUMNS = {
+    "Distance_miles": "Distance",
+    "total_timer_time": "Hours",
+    "Kjs": "Kjs",
+    "training_stress_score": "TSS",
+    "total_ascent_feet": "Ascent",
+    "total_descent_feet": "Descent",
+}
+
+# What reading one archive member can raise: truncated or corrupt data,
+# encrypted or unsupported entries, bad nested zips and gzip streams
+ARCHIVE_MEMBER_ERRORS = (
+    OSError,
+    EOFError,
+    RuntimeError,
+    NotImplementedError,
+    zipfile.BadZipFile,
+    zlib.error,
+)
+
+# Per-session columns that add up into the daily calendar table
+DAILY_TOTAL_COLUMNS = [
+    "Distance_miles",
+    "total_timer_time",
+    "training_stress_score",
+    "Kjs",
+    "total_ascent_feet",
+    "total_descent_feet",
+]
+
+
+def raw_session(dic: dict) -> dict:
+    return {str(k): v for k, v in dic.items() if not str(k).isdigit()}
+
+
+def format_durations(seconds: np.ndarray) -> np.ndarray:
+    # Same text as str(timedelta(seconds=round(v))), e.g. "1:05:09" or
+    # "1 day, 2:00:00"; np.round and round() both round half to even
+    secs = np.round(np.nan_to_num(seconds)).astype("int64")
+    days, rem = np.divmod(secs, 86400)
+    hours, rem = np.divmod(rem, 3600)
+    minutes, secs = np.divmod(rem, 60)
+    text = [
+        (
+            f"{d} day{'' if d == 1 else 's'}, {h}:{m:02d}:{s:02d}"
+            if d
+            else f"{h}:{m:02d}:{s:02d}"
+        )
+        for d, h, m, s in zip(
+            days.tolist(), hours.tolist(), minutes.tolist(), secs.tolist()
+        )
+    ]
+    return np.array(text, dtype=object)
+
+
+def format_balance(right: pd.Series) -> pd.Series:
+    # Right-side power share -> "52% R | 48% L"; missing stays missing
+    return right.map(lambda r: f"{r:.0f}% R | {100 - r:.0f}% L", na_action="ignore")
+
+
+def to_denver(epoch_seconds: np.ndarray) -> pd.DatetimeIndex:
+    # Sessions without the field are NaN here and become NaT. Only the valid
+    # values are converted: pandas can report a spurious overflow for NaN
+    # input, depending on floating-point flags left by earlier operations.
+    valid = ~np.isnan(epoch_seconds)
+    stamps = np.full(len(epoch_seconds), np.datetime64("NaT"), dtype="datetime64[ns]")
+    stamps[valid] = pd.to_datetime(epoch_seconds[valid], unit="s").values
+    utc = pd.DatetimeIndex(stamps).tz_localize("UTC")
+    return utc.tz_convert(timezone("America/Denver"))
+
+
+# Source session key -> the row keys the old per-key loop wrote in its place
+SESSION_OUTPUTS = {
+    "timestamp": ["timestamp", "yr", "week_num", "mnth", "week_num_yr", "yrmo"],
+    "start_time": ["start_time"],
+    "total_distance": ["Distance_miles"],
+    "total_elapsed_time": ["RidingTime"],
+    "total_timer_time": ["total_timer_time", "PedalTime"],
+    "total_ascent": ["total_ascent_feet"],
+    "total_descent": ["total_descent_feet"],
+    "avg_temperature": ["avg_temp_f"],
+    "avg_speed": ["avg_MPH"],
+    "total_work": ["Kjs"],
+    "left_right_balance": ["PowerBalance"],
+}
+
+
+def normalize_sessions(sessions: list) -> list:
+    # Derive the dashboard columns for a whole batch of raw session dicts at once.
+    # Output rows match the old per-key loop exactly: same keys, same key order
+    # (derived keys sit where their source key was) and the same values.
+    n = len(sessions)
+    if not n:
+        return []
+
+    # Sessions from the same device share a key layout, so each layout is
+    # transposed into columns in one go and scattered into batch-wide arrays
+    layouts = {}
+    for i, session in enumerate(sessions):
+        layouts.setdefault(tuple(session), []).append(i)
+
+    groups = []
+    inputs = {}
+    for layout, positions in layouts.items():
+        columns = dict(zip(layout, zip(*(sessions[i].values() for i in positions))))
+        positions = np.array(positions)
+        for name, values in columns.items():
+            if name not in SESSION_OUTPUTS:
+                continue
+            if name not in inputs:
+                inputs[name] = np.full(n, np.nan)
+            if name in ("timestamp", "start_time"):
+                values = [v.timestamp() for v in values]
+            inputs[name][positions] = values
+        groups.append((layout, positions, columns))
+
+    derived = {}
+    if "timestamp" in inputs:
+        local = to_denver(inputs["timestamp"])
+        year = np.nan_to_num(local.year.to_numpy(dtype="float64")).astype("int64")
+        month = np.nan_to_num(local.month.to_numpy(dtype="float64")).astype("int64")
+        week = local.isocalendar()["week"].fillna(0).to_numpy(dtype="int64")
+        wall = local.tz_localize(None).to_numpy()
+        derived["timestamp"] = wall.astype("datetime64[D]").astype(str).astype(object)
+        derived["yr"] = year
+        derived["week_num"] = week
+        derived["mnth"] = month
+        derived["week_num_yr"] = np.array(
+            [f"{y}_{w}" for y, w in zip(year.tolist(), week.tolist())], dtype=object
+        )
+        derived["yrmo"] = year * 100 + month
+    if "start_time" in inputs:
+        local = to_denver(inputs["start_time"])
+        wall = local.tz_localize(None).to_numpy()
+        utc_wall = local.tz_convert("UTC").tz_localize(None).to_numpy()
+        offsets = np.nan_to_num((wall - utc_wall) / np.timedelta64(1, "m"))
+        offsets = offsets.astype("int64").tolist()
+        offset_text = {
+            o: f"{'-' if o < 0 else '+'}{abs(o) // 60:02d}:{abs(o) % 60:02d}"
+            for o in set(offsets)
+        }
+        # FIT times are whole seconds, so this is str(datetime), e.g.
+        # "2024-05-01 07:12:00-06:00"
+        stamps = wall.astype("datetime64[s]").astype(str).tolist()
+        derived["start_time"] = np.array(
+            [f"{t[:10]} {t[11:]}{offset_text[o]}" for t, o in zip(stamps, offsets)],
+            dtype=object,
+        )
+    if "total_distance" in inputs:
+        derived["Distance_miles"] = (inputs["total_distance"] / 1000) * 0.621371
+    if "total_elapsed_time" in inputs:
+        derived["RidingTime"] = format_durations(inputs["total_elapsed_time"])
+    if "total_timer_time" in inputs:
+        derived["PedalTime"] = format_durations(inputs["total_timer_time"])
+    if "total_ascent" in inputs:
+        derived["total_ascent_feet"] = inputs["total_ascent"] * 3.28084
+    if "total_descent" in inputs:
+        derived["total_descent_feet"] = inputs["total_descent"] * 3.28084
+    if "avg_temperature" in inputs:
+        temp = np.round((inputs["avg_temperature"] * 9 / 5) + 32)
+        derived["avg_temp_f"] = np.nan_to_num(temp).astype("int64")
+    if "avg_speed" in inputs:
+        derived["avg_MPH"] = inputs["avg_speed"] * 2.23694
+    if "total_work" in inputs:
+        derived["Kjs"] = inputs["total_work"] / 1000
+    if "left_right_balance" in inputs:
+        balance = inputs["left_right_balance"]
+        right_pct = balance / (32768 + balance)
+        left_pct = 1 - right_pct
+        # f"{x:.0%}" rounds x * 100 half to even, which is what np.rint does
+        right = np.nan_to_num(np.rint(right_pct * 100)).astype("int64").tolist()
+        left = np.nan_to_num(np.rint(left_pct * 100)).astype("int64").tolist()
+        derived["PowerBalance"] = np.array(
+            [f"{r}% R | {l}% L" for r, l in zip(right, left)], dtype=object
+        )
 
+    rows = [None] * n
+    for layout, positions, columns in groups:
+        out_keys = []
+        for k in layout:
+            out_keys.extend(SESSION_OUTPUTS.get(k, [k]))
+
+        # Same outcome as popping total_grit then avg_flow and bailing out
+        # with a message at the first one that is missing
+        missing = "total_grit" not in out_keys
+        if not missing:
+            out_keys.remove("total_grit")
+            missing = "avg_flow" not in out_keys
+            if not missing:
+                out_keys.remove("avg_flow")
+        if missing:
+            for _ in positions:
+                print("File Load Error")
+
+        out_columns = [
+            derived[name][positions].tolist() if name in derived else columns[name]
+            for name in out_keys
+        ]
+        if not out_keys:
+            for i in positions.tolist():
+                rows[i] = {}
+        for i, values in zip(positions.tolist(), zip(*out_columns)):
+            rows[i] = dict(zip(out_keys, values))
+    return rows
+
+
+def decode_fit_file(
+    file_path: str, data: Optional[bytes] = None, with_records: bool = False
+) -> Tuple[str, list, Optional[dict], Optional[str]]:
+    # Module level so it can be shipped to a process pool; never raises, a bad
+    # file comes back as an error string instead of aborting the whole batch.
+    # Archive members arrive as bytes and are labelled "<zip>::<member>".
+    records = None
+    try:
+        if data is None:
+            stream = Stream.from_file(file_path)
+        else:
+            stream = Stream.from_byte_array(bytearray(data))
+        decoder = Decoder(stream)
+        messages, errors = decoder.read()
+        rows = [raw_session(dic) for dic in messages.get("session_mesgs", [])]
+        if with_records:
+            records = records_to_columns(messages.get("record_mesgs", []))
+    except Exception as e:
+        return file_path, [], None, f"{type(e).__name__}: {e}"
+
+    if errors and not rows:
+        return file_path, rows, records, "; ".join(str(e) for e in errors)
+    return file_path, rows, records, None
+
+
+# Process-wide decode workers, see decode_pool()
+DECODE_POOL = None
+
+
+def decode_pool(workers: int) -> Optional[ProcessPoolExecutor]:
+    # Forked workers avoid re-importing main.py (spawn would rerun the whole
+    # startup ingest in every child), but forking a process with other threads
+    # can leave the child stuck on a lock one of them held. So the pool is
+    # forked once, while this process still has a single thread, and reused by
+    # every later ingest; main.py creates it before starting any threads. Once
+    # threads are running without a pool, decoding stays in-process, as it
+    # does whenever a single worker is asked for. The pool isn't resized
+    # later (that would mean forking again), so its size may differ from
+    # ``workers``.
+    global DECODE_POOL
+    if workers <= 1:
+        return None
+    if (
+        DECODE_POOL is None
+        and threading.active_count() == 1
+        and "fork" in multiprocessing.get_all_start_methods()
+    ):
+        DECODE_POOL = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork")
+        )
+        # With the fork start method every worker is started on the first
+        # submit and never replaced, so nothing is forked after this
+        DECODE_POOL.submit(int).result()
+    return DECODE_POOL
+
+
+@stage_timer.timed_methods
 class CyclingDataProcessor:
-    def __init__(self):
-        self.download_path = "/Users/tylerfitzgerald/Downloads/"
+    def __init__(
+        self,
+        download_path: Optional[str] = None,
+        data_files_path: Optional[str] = None,
+    ):
+        # Without paths this is the original single-rider setup
+        self.download_path = download_path or "/Users/tylerfitzgerald/Downloads/"
         self.data_files_path = (
-            "/Users/tylerfitzgerald/Documents/activities/output/Data_files/"
+            data_files_path
+            or "/Users/tylerfitzgerald/Documents/activities/output/Data_files/"
         )
         self.logs_path = "/Users/tylerfitzgerald/Documents/activities/output/logs/"
         self.processed_files_path = os.path.join(
             self.data_files_path, "processed_files.json"
         )
+        self.manifest = self.load_manifest()
+        self.pending_manifest = {}
+        self.decode_workers = os.cpu_count() or 1
+        self.decode_batch_size = 256
+        self.decode_errors = {}
+        self.pending_archives = []
+        self.current_data_file = None
+        self.store = ActivityStore(os.path.join(self.data_files_path, "activities"))
+        self.schema = ActivitySchema()
+        self.record_ingest = False
+        self.records = RecordStore(os.path.join(self.data_files_path, "records"))
+        self.ingest_lock_file = None
+
+    def acquire_ingest_lock(self) -> bool:
+        # Only one process per launch may ingest (the Werkzeug reloader runs two,
+        # a second launch makes three); the OS releases the lock when the
+        # holder exits. Without fcntl (Windows) every process may ingest.
+        if self.ingest_lock_file is not None or fcntl is None:
+            return True
+        os.makedirs(self.data_files_path, exist_ok=True)
+        lock_file = open(os.path.join(self.data_files_path, ".ingest.lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self.ingest_lock_file = lock_file
+        return True
+
+    def load_manifest(self) -> dict:
+        if not os.path.exists(self.processed_files_path):
+            return {}
+        with open(self.processed_files_path) as f:
+            return json.load(f)
+
+    def commit_manifest(self) -> None:
+        # Only called once the decoded rows have been written out, so a crash
+        # mid-ingest leaves the files unrecorded and they get decoded again
+        if not self.pending_manifest:
+            return
+        self.manifest.update(self.pending_manifest)
+        self.pending_manifest = {}
+        tmp_path = self.processed_files_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, self.processed_files_path)
+
+        # Archives are only removed now that their sessions are committed, and
+        # kept if any member failed so it can be looked at
+        for archive_path in self.pending_archives:
+            failed = [
+                label
+                for label in self.decode_errors
+                if label.startswith(archive_path + "::")
+            ]
+            if failed:
+                print(f"Keeping {archive_path}: {len(failed)} members failed")
+            elif os.path.exists(archive_path):
+                os.remove(archive_path)
+        self.pending_archives = []
+
+    def file_hash(self, file_path: str) -> str:
+        digest = hashlib.sha1()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def missing_records(self, record: dict) -> bool:
+        # Files ingested before record_ingest was switched on are decoded once
+        # more to backfill their per-second data
+        return self.record_ingest and not record.get("records", False)
+
+    def needs_processing(self, entry: os.DirEntry) -> bool:
+        stat = entry.stat()
+        record = self.manifest.get(entry.path)
+        if (
+            record is not None
+            and record["size"] == stat.st_size
+            and record["mtime_ns"] == stat.st_mtime_ns
+            and not self.missing_records(record)
+        ):
+            return False
+
+        # Size or mtime moved (or the file is new), fall back to the content
+        # hash so a touched-but-identical file is not decoded again
+        sha1 = self.file_hash(entry.path)
+        if (
+            record is not None
+            and record["sha1"] == sha1
+            and not self.missing_records(record)
+        ):
+            self.pending_manifest[entry.path] = dict(
+                record, size=stat.st_size, mtime_ns=stat.st_mtime_ns
+            )
+            return False
 
-    def unzipfiles(self):
-        with os.scandir(self.download_path) as path:
-            cnt = 0
-            for entry in path:
-                if entry.name.endswith(".zip") and entry.is_file():
-                    cnt += 1
-                    with ZipFile(entry.path, "r") as zip:
-                        zip.printdir()
-
-                        print("Extracting all the files now...")
-                        zip.extractall(path=self.download_path)
-                        os.remove(entry.path)
-                        print("Done!")
+        self.pending_manifest[entry.path] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha1": sha1,
+            "sessions": [],
+        }
+        return True
+
+    def member_needs_processing(self, label: str, data: bytes) -> bool:
+        # Members have no stat of their own, so the content hash decides
+        sha1 = hashlib.sha1(data).hexdigest()
+        record = self.manifest.get(label)
+        if (
+            record is not None
+            and record["sha1"] == sha1
+            and not self.missing_records(record)
+        ):
+            return False
+        self.pending_manifest[label] = {
+            "size": len(data),
+            "mtime_ns": None,
+            "sha1": sha1,
+            "sessions": [],
+        }
+        return True
+
+    def iter_archive(self, label: str, archive: ZipFile):
+        # A member that can't be read is recorded in decode_errors and
+        # skipped; the rest of the archive is still read
+        for info in archive.infolist():
+            name = info.filename.lower()
+            member = f"{label}::{info.filename}"
+            if info.is_dir():
+                continue
+            try:
+                if name.endswith(".zip"):
+                    nested = ZipFile(io.BytesIO(archive.read(info)))
+                elif name.endswith(".fit"):
+                    data = archive.read(info)
+                elif name.endswith(".fit.gz"):
+                    data = gzip.decompress(archive.read(info))
                 else:
-                    print("no zip files to process")
-            print("zip files unzipped:" + str(cnt))
-
-    def process_new_files(self) -> list:
-        mega_list = []
-
+                    continue
+            except ARCHIVE_MEMBER_ERRORS as e:
+                print(f"Failed to read {member}: {e}")
+                self.decode_errors[member] = str(e)
+                continue
+            if name.endswith(".zip"):
+                with nested:
+                    yield from self.iter_archive(member, nested)
+            elif self.member_needs_processing(member, data):
+                yield member, data
+
+    def iter_new_sources(self):
+        # (label, bytes or None) for every .fit on disk or inside a .zip that
+        # the manifest hasn't seen; archive members are never written to disk
         with os.scandir(self.download_path) as path:
-            for entry in path:
-                if entry.name.endswith(".fit") and entry.is_file():
-                    stream = Stream.from_file(entry.path)
-                    decoder = Decoder(stream)
-                    messages, errors = decoder.read()
-
-                    for dic in messages["session_mesgs"]:
-                        new_dict = {}
-                        for k, v in dic.items():
-                            if not str(k).isdigit():
-                                if k == "timestamp":
-                                    tz_denver = timezone("America/Denver")
-                                    v_denver = v.astimezone(tz_denver)
-                                    new_dict[str(k)] = str(v_denver.date())
-                                    new_dict["yr"] = v_denver.year
-                                    new_dict["week_num"] = v_denver.isocalendar().week
-                                    new_dict["mnth"] = v_denver.month
-                                    new_dict["week_num_yr"] = (
-                                        f"{v_denver.year}_{v_denver.isocalendar().week}"
-                                    )
-                                    new_dict["yrmo"] = int(
-                                        v_denver.year * 100 + v_denver.month
-                                    )
-                                elif k == "start_time":
-                                    new_dict[str(k)] = str(
-                                        v.astimezone(timezone("America/Denver"))
-                                    )
-                                elif k == "total_distance":
-                                    new_dict["Distance_miles"] = (v / 1000) * 0.621371
-                                elif k == "total_elapsed_time":
-                                    new_dict["RidingTime"] = str(
-                                        timedelta(seconds=round(v))
-                                    )
-                                elif k == "total_timer_time":
-                                    new_dict[k] = v
-                                    new_dict["PedalTime"] = str(
-                                        timedelta(seconds=round(v))
-                                    )
-                                elif k == "total_ascent":
-                                    new_dict["total_ascent_feet"] = v * 3.28084
-                                elif k == "total_descent":
-                                    new_dict["total_descent_feet"] = v * 3.28084
-                                elif k == "avg_temperature":
-                                    new_dict["avg_temp_f"] = round((v * 9 / 5) + 32)
-                                elif k == "avg_speed":
-                                    new_dict["avg_MPH"] = v * 2.23694
-                                elif k == "total_work":
-                                    new_dict["Kjs"] = v / 1000
-                                elif k == "left_right_balance":
-                                    right_pct = v / (32768 + v)
-                                    left_pct = 1 - right_pct
-                                    new_dict["PowerBalance"] = (
-                                        f"{right_pct:.0%} R | {left_pct:.0%} L"
-                                    )
-                                else:
-                                    new_dict[str(k)] = v
-                        try:
-                            new_dict.pop("total_grit")
-                            new_dict.pop("avg_flow")
-                        except:
-                            print("File Load Error")
-                            pass
-                        mega_list.append(new_dict)
+            entries = sorted(
+                (entry for entry in path if entry.is_file()), key=lambda e: e.name
+            )
+        for entry in entries:
+            if entry.name.endswith(".fit") and self.needs_processing(entry):
+                yield entry.path, None
+            elif entry.name.endswith(".zip") and self.needs_processing(entry):
+                self.pending_archives.append(entry.path)
+                try:
+                    with ZipFile(entry.path, "r") as archive:
+                        yield from self.iter_archive(entry.path, archive)
+                except ARCHIVE_MEMBER_ERRORS as e:
+                    print(f"Failed to read {entry.path}: {e}")
+                    self.decode_errors[entry.path + "::"] = str(e)
+                    self.pending_manifest[entry.path]["error"] = str(e)
+                    continue
+                skipped = [
+                    label
+                    for label in self.decode_errors
+                    if label.startswith(entry.path + "::")
+                ]
+                if skipped:
+                    # Leave the archive unrecorded so the skipped members are
+                    # read again next pass; members that were read are
+                    # recorded on their own and won't be decoded twice
+                    del self.pending_manifest[entry.path]
+
+    def decode_sources(
+        self, sources: Iterable[Tuple[str, Optional[bytes]]], workers: int
+    ) -> list:
+        # Archives are read lazily as sources are pulled, so this covers unzip
+        # and decode together. Sources are fed to the pool in batches so a
+        # large archive isn't held in memory; map keeps results in order.
+        global DECODE_POOL
+        pool = decode_pool(workers)
+        results = []
+        batch = list(islice(sources, self.decode_batch_size))
+        while batch:
+            if pool is not None and len(batch) > 1:
+                labels, datas = zip(*batch)
+                try:
+                    results.extend(
+                        list(
+                            pool.map(
+                                decode_fit_file,
+                                labels,
+                                datas,
+                                repeat(self.record_ingest),
+                                # Sized from the pool, which may have been
+                                # created for a different worker count
+                                chunksize=max(1, len(batch) // (pool._max_workers * 4)),
+                            )
+                        )
+                    )
+                    batch = list(islice(sources, self.decode_batch_size))
+                    continue
+                except BrokenProcessPool as e:
+                    # A worker died (it can't be re-forked safely); finish
+                    # in-process
+                    print(f"Decode pool failed, decoding in-process: {e}")
+                    DECODE_POOL = pool = None
+            results.extend(
+                decode_fit_file(label, data, self.record_ingest)
+                for label, data in batch
+            )
+            batch = list(islice(sources, self.decode_batch_size))
+        return results
+
+    def process_new_files(self, workers: Optional[int] = None) -> list:
+        workers = workers or self.decode_workers
+        self.decode_errors = {}
+        sources = self.iter_new_sources()
+        results = self.decode_sources(sources, workers)
+
+        raw_sessions = []
+        for file_path, sessions, _, error in results:
+            if error is not None:
+                print(f"Failed to decode {file_path}: {error}")
+                self.decode_errors[file_path] = error
+                self.pending_manifest[file_path]["error"] = error
+            raw_sessions.extend(sessions)
+
+        with stage_timer.span("ingest.normalize") as span:
+            mega_list = normalize_sessions(raw_sessions)
+            span["rows"] = len(mega_list)
+        position = 0
+        for file_path, sessions, records, _ in results:
+            rows = mega_list[position : position + len(sessions)]
+            position += len(sessions)
+            self.pending_manifest[file_path]["sessions"] = [
+                session_key(row) for row in rows
+            ]
+            if records is not None:
+                self.store_records(sessions, rows, records)
+                self.pending_manifest[file_path]["records"] = True
+        if self.record_ingest:
+            self.records.save_index()
         return mega_list
 
+    def store_records(self, sessions: list, rows: list, records: dict) -> None:
+        # A multisport file carries several sessions; each gets the records
+        # that fall inside its own start..end window
+        for session, row in zip(sessions, rows):
+            if len(sessions) == 1:
+                columns = records
+            else:
+                start = session.get("start_time")
+                end = session.get("timestamp")
+                if pd.isna(start) or pd.isna(end):
+                    # Without a window the records can't be split; the
+                    # session row is still stored, just without records
+                    print(f"Skipping records for {session_key(row)}: no start/end time")
+                    continue
+                start, end = start.timestamp(), end.timestamp()
+                ts = records["timestamp"]
+                mask = (ts >= start) & (ts <= end)
+                columns = {name: values[mask] for name, values in records.items()}
+            self.records.write_ride(session_key(row), columns)
+
+    def load_ride_records(
+        self, ride_key: str, columns: Optional[List[str]] = None
+    ) -> Dict[str, np.ndarray]:
+        return self.records.load_ride(ride_key, columns=columns)
+
     def read_existing_files(self) -> list:
-        # Get only JSON files
-        files = [f for f in os.listdir(self.data_files_path) if f.endswith(".json")]
+        # Get only the summary JSON files (the ingest manifest lives alongside)
+        files = [
+            f
+            for f in os.listdir(self.data_files_path)
+            if f.startswith("HL_Summary_") and f.endswith(".json")
+        ]
         if not files:
             raise ValueError(f"No JSON files found in {self.data_files_path}")
 
@@ -123,26 +608,81 @@ class CyclingDataProcessor:
         all_activities = json.load(
             open(f"""{self.data_files_path}/{currentdatafile}""")
         )
+        self.current_data_file = currentdatafile
         return all_activities
 
-    def create_new_file(self, new_file: list, existing_file: list) -> list:
-        seen = []
-        for i in new_file:
-            existing_file.append(i)
+    def upsert_rows(self, rows: list, existing_file: list, index: dict) -> list:
+        # Merge policy: a row whose key is already known replaces the stored row
+        # in place when its content changed (e.g. a re-exported file), otherwise
+        # it is dropped as a duplicate; unknown keys are appended
+        for row in rows:
+            key = session_key(row)
+            digest = row_hash(row)
+            entry = index.get(key)
+            if entry is None:
+                index[key] = [len(existing_file), digest]
+                existing_file.append(row)
+            elif entry[1] != digest:
+                existing_file[entry[0]] = row
+                entry[1] = digest
+        return existing_file
 
-        for x in existing_file:
-            if x not in seen:
-                seen.append(x)
-        return seen
+    def create_new_file(self, new_file: list, existing_file: list) -> list:
+        # List merge for the legacy JSON snapshots; building the index from the
+        # history also drops duplicates already stored in it
+        index = {}
+        existing_file = self.upsert_rows(existing_file, [], index)
+        return self.upsert_rows(new_file, existing_file, index)
 
     def write_out_file(self, outfile: list) -> None:
-        max_dates = [
-            datetime.strptime(k["timestamp"], "%Y-%m-%d").date() for k in outfile
-        ]
-        max_date = str(max(max_dates)).replace("-", "")
-        output_path = os.path.join(self.data_files_path, f"HL_Summary_{max_date}.json")
-        with open(output_path, "w") as of:
-            json.dump(outfile, of)
+        added = self.store.upsert(outfile)
+        print(f"Stored {added} new or updated sessions")
+
+    def merge_rows(self, frame: pd.DataFrame, rows: list) -> pd.DataFrame:
+        # Fold freshly ingested rows into an in-memory frame the same way the
+        # store resolves its log: a row replaces any row with the same key
+        new_df = self.create_dataframe(rows)
+        if frame.empty:
+            return new_df
+        if new_df.empty:
+            return frame
+        keep = frame[~self.store.frame_keys(frame).isin(self.store.frame_keys(new_df))]
+        # Categories differ between the two halves, so retype the result
+        return self.schema.apply(pd.concat([keep, new_df], ignore_index=True))
+
+    def migrate_json_snapshots(self) -> None:
+        # One-time move of the newest HL_Summary_*.json into the columnar store;
+        # the JSON files are left in place as a backup
+        if not self.store.is_empty() or not os.path.isdir(self.data_files_path):
+            return
+        try:
+            existing_data = self.read_existing_files()
+        except ValueError:
+            return
+        print(f"Migrating {self.current_data_file} to {self.store.store_path}")
+        self.store.replace_all(self.create_new_file([], existing_data))
+
+    def compact(self) -> None:
+        folded = self.store.compact()
+        print(f"Compacted {folded} logged sessions into {self.store.store_path}")
+
+        # With the store as the source of truth, every HL_Summary_*.json except
+        # the newest (the migration source, kept as a backup) is superseded
+        snapshots = sorted(
+            (
+                os.path.join(self.data_files_path, f)
+                for f in os.listdir(self.data_files_path)
+                if f.startswith("HL_Summary_") and f.endswith(".json")
+            ),
+            key=os.path.getctime,
+        )
+        for snapshot in snapshots[:-1]:
+            os.remove(snapshot)
+
+    def load_activities(
+        self, columns: Optional[List[str]] = None, years: Optional[List[int]] = None
+    ) -> pd.DataFrame:
+        return self.schema.apply(self.store.read(columns=columns, years=years))
 
     def create_future_dates_df(self, start_dt: str, end_dt: str) -> pd.DataFrame:
         df = pd.DataFrame({"timestamp": pd.date_range(start_dt, end_dt)})
@@ -151,26 +691,87 @@ class CyclingDataProcessor:
         return df
 
     def create_dataframe(self, input_file: list) -> pd.DataFrame:
-        return pd.DataFrame(input_file)
+        return self.schema.apply(pd.DataFrame(input_file))
 
     def merge_dataframes(
         self, date_frame: pd.DataFrame, actual_frame: pd.DataFrame
     ) -> pd.DataFrame:
-        df_merged = pd.merge(date_frame, actual_frame, how="left", on="timestamp")
+        # Calendar dates come as text, typed activity frames as datetimes
+        df_merged = pd.merge(
+            date_frame.assign(timestamp=pd.to_datetime(date_frame["timestamp"])),
+            actual_frame.assign(timestamp=pd.to_datetime(actual_frame["timestamp"])),
+            how="left",
+            on="timestamp",
+        )
         df_merged = df_merged.sort_values(by=["timestamp"])
         df_merged["training_stress_score"] = df_merged["training_stress_score"].fillna(
             0
         )
         df_merged["CTL"] = df_merged["training_stress_score"].rolling(window=42).mean()
-        df_merged["timestamp"] = pd.to_datetime(df_merged["timestamp"])
         return df_merged
 
-    def get_monthly_data(self, merged_df: pd.DataFrame) -> pd.DataFrame:
-        aggregate_df = (
-            merged_df.groupby(["yrmo"])[["Distance_miles", "total_timer_time"]]
+    def create_daily_table(
+        self, activities: pd.DataFrame, horizon_days: int = 365
+    ) -> pd.DataFrame:
+        # One row per calendar day from the first ride to a year past today,
+        # indexed by date. Multi-ride days are summed and rest days are zero,
+        # so a date range is just a slice.
+        today = pd.Timestamp(datetime.now().date())
+        dates = pd.to_datetime(activities.get("timestamp", pd.Series(dtype=str)))
+        start = dates.min() if not dates.empty else today
+        end = max(dates.max(), today) if not dates.empty else today
+        calendar = pd.date_range(
+            start, end + pd.Timedelta(days=horizon_days), name="date"
+        )
+
+        totals = [c for c in DAILY_TOTAL_COLUMNS if c in activities.columns]
+        daily = (
+            # Summed as float64 so the float32 per-ride values don't carry
+            # their representation error into the totals
+            activities[totals]
+            .astype("float64")
+            .groupby(dates.values)
             .sum()
-            .reset_index()
+            .reindex(calendar, fill_value=0)
+        )
+        for col in DAILY_TOTAL_COLUMNS:
+            if col not in daily.columns:
+                daily[col] = 0.0
+        daily["rides"] = dates.value_counts().reindex(calendar, fill_value=0)
+        daily["timestamp"] = daily.index
+        daily["yr"] = daily.index.year
+        daily["yrmo"] = daily.index.year * 100 + daily.index.month
+        # RidingTime marks ride days for the helpers that filter on it
+        daily["RidingTime"] = np.where(
+            daily["rides"] > 0, format_durations(daily["total_timer_time"].values), None
         )
+        return daily
+
+    def daily_slice(
+        self, daily: pd.DataFrame, start_dt: str, end_dt: str
+    ) -> pd.DataFrame:
+        return daily.loc[str(start_dt)[:10] : str(end_dt)[:10]]
+
+    def get_monthly_data(
+        self, merged_df: Union[pd.DataFrame, PrefixSums], start_dt=None, end_dt=None
+    ) -> pd.DataFrame:
+        # Row frames are grouped; prefix sums answer for start_dt..end_dt
+        # without touching the rows
+        if isinstance(merged_df, PrefixSums):
+            totals = merged_df.buckets(start_dt, end_dt, "month")
+            aggregate_df = pd.DataFrame(
+                {
+                    "yrmo": totals.index.year * 100 + totals.index.month,
+                    "Distance_miles": totals["Distance_miles"].values,
+                    "total_timer_time": totals["total_timer_time"].values,
+                }
+            )
+        else:
+            aggregate_df = (
+                merged_df.groupby(["yrmo"])[["Distance_miles", "total_timer_time"]]
+                .sum()
+                .reset_index()
+            )
         aggregate_df = aggregate_df.sort_values(by=["yrmo"])
         aggregate_df["total_timer_time"] = round(
             aggregate_df["total_timer_time"] / 3600, 2
@@ -178,12 +779,24 @@ class CyclingDataProcessor:
         aggregate_df["yrmo"] = aggregate_df["yrmo"].astype(int)
         return aggregate_df
 
-    def get_annual_data(self, merged_df: pd.DataFrame) -> pd.DataFrame:
-        aggregate_df = (
-            merged_df.groupby(["yr"])[["Distance_miles", "total_timer_time"]]
-            .sum()
-            .reset_index()
-        )
+    def get_annual_data(
+        self, merged_df: Union[pd.DataFrame, PrefixSums], start_dt=None, end_dt=None
+    ) -> pd.DataFrame:
+        if isinstance(merged_df, PrefixSums):
+            totals = merged_df.buckets(start_dt, end_dt, "year")
+            aggregate_df = pd.DataFrame(
+                {
+                    "yr": totals.index.year,
+                    "Distance_miles": totals["Distance_miles"].values,
+                    "total_timer_time": totals["total_timer_time"].values,
+                }
+            )
+        else:
+            aggregate_df = (
+                merged_df.groupby(["yr"])[["Distance_miles", "total_timer_time"]]
+                .sum()
+                .reset_index()
+            )
         aggregate_df = aggregate_df.sort_values(by=["yr"])
         aggregate_df["total_timer_time"] = round(
             aggregate_df["total_timer_time"] / 3600, 2
@@ -204,6 +817,7 @@ class CyclingDataProcessor:
         daily_df = (
             merged_df.groupby("date")
             .agg({"Distance_miles": "sum", "total_timer_time": "sum"})
+            .astype("float64")
             .reset_index()
         )
 
@@ -218,10 +832,17 @@ class CyclingDataProcessor:
 
         return daily_df
 
-    def weekly_summary_rides(self, merged_df: pd.DataFrame):
-        df1 = merged_df[merged_df["week_num"] >= np.max(merged_df["week_num"] - 5)]
+    def weekly_summary_rides(self, merged_df: pd.DataFrame, weeks: int = 6):
+        # The last ``weeks`` Monday-Sunday weeks up to the latest ride, keyed
+        # by each week's Monday since ISO week numbers repeat every year.
+        # Calendar rows without a ride (no week_num) are left out.
+        rides = merged_df[merged_df["week_num"].notna()]
+        days = pd.to_datetime(rides["timestamp"]).dt.normalize()
+        week_start = days - pd.to_timedelta(days.dt.weekday, unit="D")
+        in_range = week_start > week_start.max() - pd.Timedelta(weeks=weeks)
+        df1 = rides[in_range]
         recent_rides = (
-            df1.groupby(["week_num"])
+            df1.groupby(week_start[in_range].rename("week_start"))
             .agg(
                 start_date=("timestamp", "min"),
                 end_date=("timestamp", "max"),
@@ -233,6 +854,9 @@ class CyclingDataProcessor:
             )
             .round()
         )
+        recent_rides.index = pd.Index(
+            recent_rides.index.isocalendar()["week"].values, name="week_num"
+        )
         recent_rides["start_date"] = recent_rides["start_date"].astype("str")
         recent_rides["end_date"] = recent_rides["end_date"].astype("str")
         return recent_rides.sort_values("end_date", ascending=False)
@@ -263,6 +887,7 @@ class CyclingDataProcessor:
             .round()
         )
         outfile["timestamp"] = outfile["timestamp"].astype("str")
+        outfile["PowerBalance"] = format_balance(outfile["PowerBalance"])
         return outfile.rename(
             columns={
                 "avg_cadence": "Avg Cadence",
@@ -274,143 +899,38 @@ class CyclingDataProcessor:
             }
         ).dropna()
 
-    def get_current_month_weekly_summary(self, merged_df: pd.DataFrame) -> pd.DataFrame:
-        # Filter for rides with data
-        rides_df = merged_df[merged_df["RidingTime"].notnull()].copy()
-
-        if rides_df.empty:
-            return pd.DataFrame()
-
-        # Convert timestamp to datetime for date operations if it's not already
-        if not pd.api.types.is_datetime64_any_dtype(rides_df["timestamp"]):
-            rides_df["timestamp"] = pd.to_datetime(rides_df["timestamp"])
-
-        # Get current month and year
-        current_month = datetime.now().month
-        current_year = datetime.now().year
-
-        # Get first and last day of current month
-        first_day = datetime(current_year, current_month, 1)
-        if current_month == 12:
-            last_day = datetime(current_year + 1, 1, 1) - timedelta(days=1)
-        else:
-            last_day = datetime(current_year, current_month + 1, 1) - timedelta(days=1)
-
-        # Find weeks that overlap with current month
-        # Calculate first day of the week (Monday) for first day of month
-        first_week_start = first_day - timedelta(days=first_day.weekday())
-
-        # Calculate first day of the week (Monday) for last day of month
-        last_week_start = last_day - timedelta(days=last_day.weekday())
-
-        # Get data for a wider range to include overlapping weeks
-        extended_start = first_week_start - timedelta(
-            days=1
-        )  # Include previous week if needed
-        extended_end = last_week_start + timedelta(
-            days=8
-        )  # Include next week if needed
-
-        # Get all activities from relevant weeks
-        all_df = self.create_dataframe(self.read_existing_files())
-        all_df["timestamp"] = pd.to_datetime(all_df["timestamp"])
-
-        # Filter to relevant date range
-        extended_df = all_df[
-            (all_df["timestamp"] >= extended_start)
-            & (all_df["timestamp"] <= extended_end)
-            & all_df["RidingTime"].notnull()
-        ].copy()
-
-        if extended_df.empty:
-            return pd.DataFrame()
-
-        # Add ISO week number and year
-        extended_df["week_num"] = extended_df["timestamp"].dt.isocalendar().week
-        extended_df["iso_year"] = extended_df["timestamp"].dt.isocalendar().year
-        extended_df["year_week"] = (
-            extended_df["iso_year"].astype(str)
-            + "-"
-            + extended_df["week_num"].astype(str).str.zfill(2)
-        )
-
-        # Get Monday of each activity's week
-        extended_df["week_start_day"] = extended_df["timestamp"] - pd.to_timedelta(
-            extended_df["timestamp"].dt.weekday, unit="D"
-        )
-
-        # Get unique weeks in the data
-        unique_weeks = extended_df[["year_week", "week_start_day"]].drop_duplicates()
-
-        # Make sure we include all dates in those weeks, even if no activities
-        all_weeks = []
-        for _, week in unique_weeks.iterrows():
-            week_start = week["week_start_day"]
-            week_end = week_start + timedelta(days=6)
-
-            # Check if this week overlaps with current month
-            if (week_start <= last_day) and (week_end >= first_day):
-                all_weeks.append(
-                    {
-                        "year_week": week["year_week"],
-                        "week_start": week_start,
-                        "week_end": week_end,
-                    }
-                )
-
-        if not all_weeks:
-            return pd.DataFrame()
-
-        # Convert to DataFrame and sort
-        weeks_df = pd.DataFrame(all_weeks)
-        weeks_df = weeks_df.sort_values("week_start")
-
-        # Initialize results with zero values
-        results = []
-        for _, week_row in weeks_df.iterrows():
-            week_data = extended_df[extended_df["year_week"] == week_row["year_week"]]
-
-            if week_data.empty:
-                week_summary = {
-                    "year_week": week_row["year_week"],
-                    "week_start": week_row["week_start"],
-                    "week_end": week_row["week_end"],
-                    "Distance": 0,
-                    "Hours": 0,
-                    "Kjs": 0,
-                    "TSS": 0,
-                    "Ascent": 0,
-                    "Descent": 0,
-                }
-            else:
-                week_summary = {
-                    "year_week": week_row["year_week"],
-                    "week_start": week_row["week_start"],
-                    "week_end": week_row["week_end"],
-                    "Distance": week_data["Distance_miles"].sum(),
-                    "Hours": week_data["total_timer_time"].sum() / 3600,
-                    "Kjs": week_data["Kjs"].sum(),
-                    "TSS": week_data["training_stress_score"].sum(),
-                    "Ascent": week_data["total_ascent_feet"].sum(),
-                    "Descent": week_data["total_descent_feet"].sum(),
-                }
-
-            results.append(week_summary)
-
-        # Convert to DataFrame
-        weekly_summary = pd.DataFrame(results)
-
-        # Format values
-        weekly_summary["Hours"] = round(weekly_summary["Hours"], 1)
-        weekly_summary["Distance"] = round(weekly_summary["Distance"], 1)
-        weekly_summary["Kjs"] = round(weekly_summary["Kjs"], 0)
-        weekly_summary["TSS"] = round(weekly_summary["TSS"], 0)
-        weekly_summary["Ascent"] = round(weekly_summary["Ascent"], 0)
-        weekly_summary["Descent"] = round(weekly_summary["Descent"], 0)
-
-        # Extract week number for sorting
-        weekly_summary["week_num"] = (
-            weekly_summary["year_week"].str.split("-").str[1].astype(int)
+    def get_current_month_weekly_summary(
+        self, sums: PrefixSums, today: Optional[date] = None
+    ) -> pd.DataFrame:
+        # Totals for every Monday-Sunday week that overlaps the current month,
+        # labelled by its Monday; weeks without rides show up as zeros
+        today = pd.Timestamp(today or datetime.now().date())
+        first_day = today.replace(day=1)
+        last_day = first_day + pd.offsets.MonthEnd(0)
+        totals = sums.buckets(
+            first_day - pd.Timedelta(days=first_day.weekday()),
+            last_day + pd.Timedelta(days=6 - last_day.weekday()),
+            "week",
+        ).rename(columns=WEEKLY_SUMMARY_COLUMNS)
+        week_starts = totals.index
+        week_ends = week_starts + pd.Timedelta(days=6)
+
+        iso = week_starts.isocalendar()
+        weekly_summary = pd.DataFrame(
+            {
+                "year_week": iso["year"].astype(str).values
+                + "-"
+                + iso["week"].astype(str).str.zfill(2).values,
+                "week_start": week_starts,
+                "week_end": week_ends,
+                "Distance": totals["Distance"].round(1).values,
+                "Hours": (totals["Hours"] / 3600).round(1).values,
+                "Kjs": totals["Kjs"].round(0).values,
+                "TSS": totals["TSS"].round(0).values,
+                "Ascent": totals["Ascent"].round(0).values,
+                "Descent": totals["Descent"].round(0).values,
+                "week_num": iso["week"].astype(int).values,
+            }
         )
 
         # Format date range for each week
@@ -421,15 +941,7 @@ class CyclingDataProcessor:
         weekly_summary["week_range"] = (
             weekly_summary["week_start_str"] + " - " + weekly_summary["week_end_str"]
         )
-
-        # Add month indicator for spans
         weekly_summary["current_month_marker"] = ""
-        for i, row in weekly_summary.iterrows():
-            start_month = row["week_start"].month
-            end_month = row["week_end"].month
-
-        # Sort by week start date
-        weekly_summary = weekly_summary.sort_values("week_start")
 
         return weekly_summary
 
@@ -441,6 +953,15 @@ class CyclingDataProcessor:
             .iloc[0]
         )
 
+        # Durations and balance are held as numbers; show them as text
+        riding_time, pedal_time = format_durations(
+            [
+                latest_ride["RidingTime"].total_seconds(),
+                latest_ride["PedalTime"].total_seconds(),
+            ]
+        )
+        power_balance = format_balance(pd.Series([latest_ride["PowerBalance"]]))[0]
+
         # Create a dictionary of metrics with their display names
         metrics = {
             "Date": latest_ride["timestamp"].strftime(
@@ -448,15 +969,18 @@ class CyclingDataProcessor:
             ),  # Format the date properly
             "Sport": latest_ride["sub_sport"],
             "Distance (miles)": round(latest_ride["Distance_miles"], 2),
-            "Riding Time": latest_ride["RidingTime"],
-            "Pedal Time": latest_ride["PedalTime"],
+            "Riding Time": riding_time,
+            "Pedal Time": pedal_time,
             "Work (Kj)": f"{round(latest_ride['Kjs'], 0):,}",
             "Average Power": latest_ride["avg_power"],
             "Max Power": latest_ride["max_power"],
             "Normalized Power": latest_ride["normalized_power"],
-            "Training Stress Score": latest_ride["training_stress_score"],
-            "Intensity Factor": latest_ride["intensity_factor"],
-            "Power Balance": latest_ride["PowerBalance"],
+            # Rounded so float32 values don't show their representation error
+            "Training Stress Score": round(
+                float(latest_ride["training_stress_score"]), 1
+            ),
+            "Intensity Factor": round(float(latest_ride["intensity_factor"]), 3),
+            "Power Balance": power_balance,
             "Average Cadence": latest_ride["avg_cadence"],
             "Ascent (ft)": f"{round(latest_ride['total_ascent_feet'], 0):,}",
             "Descent (ft)": f"{round(latest_ride['total_descent_feet'], 0):,}",
@@ -470,8 +994,52 @@ class CyclingDataProcessor:
         return df
 
     def get_weekly_totals(
-        self, merged_df: pd.DataFrame, num_weeks: int = None
+        self,
+        merged_df: Union[pd.DataFrame, PrefixSums],
+        num_weeks: int = None,
+        start_dt=None,
+        end_dt=None,
     ) -> pd.DataFrame:
+        if isinstance(merged_df, PrefixSums):
+            # Monday-Sunday weeks with at least one ride
+            totals = merged_df.buckets(start_dt, end_dt, "week")
+            totals = totals[totals["rides"] > 0]
+            iso = totals.index.isocalendar()
+            weekly_totals = pd.DataFrame(
+                {
+                    "year_week": iso["year"].astype(str).values
+                    + "-"
+                    + iso["week"].astype(str).str.zfill(2).values,
+                    "week_start": totals.index,
+                    "Distance_miles": totals["Distance_miles"].values,
+                    "total_timer_time": totals["total_timer_time"].values,
+                }
+            )
+        else:
+            weekly_totals = self.group_weekly_totals(merged_df)
+
+        # Sort by date
+        weekly_totals = weekly_totals.sort_values("week_start", ascending=False)
+
+        # Limit to requested number of weeks if specified
+        if num_weeks is not None:
+            weekly_totals = weekly_totals.head(num_weeks)
+
+        # Convert time to hours
+        weekly_totals["hours"] = weekly_totals["total_timer_time"] / 3600
+
+        # Format values
+        weekly_totals["Distance_miles"] = weekly_totals["Distance_miles"].round(1)
+        weekly_totals["hours"] = weekly_totals["hours"].round(1)
+
+        # Format week_start as 'Mon, Jan 1'
+        weekly_totals["week_start"] = weekly_totals["week_start"].dt.strftime(
+            "%a, %b %d, %Y"
+        )
+
+        return weekly_totals
+
+    def group_weekly_totals(self, merged_df: pd.DataFrame) -> pd.DataFrame:
         # Filter for rides with data
         rides_df = merged_df[merged_df["RidingTime"].notnull()].copy()
 
@@ -489,33 +1057,13 @@ class CyclingDataProcessor:
 
         # Calculate week start date (Monday)
         rides_df["week_start"] = (
-            rides_df["timestamp"].dt.to_period("W-MON").dt.start_time
+            rides_df["timestamp"].dt.to_period("W-SUN").dt.start_time
         )
 
         # Group by week and calculate totals
-        weekly_totals = (
+        return (
             rides_df.groupby(["year_week", "week_start"])
             .agg({"Distance_miles": "sum", "total_timer_time": "sum"})
+            .astype("float64")
             .reset_index()
         )
-
-        # Sort by date
-        weekly_totals = weekly_totals.sort_values("week_start", ascending=False)
-
-        # Limit to requested number of weeks if specified
-        if num_weeks is not None:
-            weekly_totals = weekly_totals.head(num_weeks)
-
-        # Convert time to hours
-        weekly_totals["hours"] = weekly_totals["total_timer_time"] / 3600
-
-        # Format values
-        weekly_totals["Distance_miles"] = weekly_totals["Distance_miles"].round(1)
-        weekly_totals["hours"] = weekly_totals["hours"].round(1)
-
-        # Format week_start as 'Mon, Jan 1'
-        weekly_totals["week_start"] = weekly_totals["week_start"].dt.strftime(
-            "%a, %b %d, %Y"
-        )
-
-        return weekly_totals
@@ -0,0 +1,107 @@
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Time constants in days for chronic and acute training load
+CTL_DAYS = 42
+ATL_DAYS = 7
+
+
+class FitnessEngine:
+    """Exponentially weighted CTL/ATL/TSB over the whole training history,
+    persisted to ``series_path`` and extended from the first changed day."""
+
+    def __init__(self, series_path: str):
+        self.series_path = series_path
+        self.series = None
+        self.lock = threading.RLock()
+
+    def load(self) -> pd.DataFrame:
+        series = self.series
+        if series is None:
+            if os.path.exists(self.series_path):
+                series = pq.read_table(self.series_path).to_pandas()
+                series = series.set_index("date")
+            else:
+                series = pd.DataFrame(
+                    columns=["tss", "CTL", "ATL", "TSB"],
+                    index=pd.DatetimeIndex([], name="date"),
+                    dtype="float64",
+                )
+            self.series = series
+        return series
+
+    def unload(self) -> None:
+        # Read back from series_path on next use
+        with self.lock:
+            self.series = None
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.series_path), exist_ok=True)
+        tmp_path = self.series_path + ".tmp"
+        table = pa.Table.from_pandas(self.series.reset_index(), preserve_index=False)
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, self.series_path)
+
+    def first_change(self, tss: pd.Series) -> Optional[int]:
+        # Position in ``tss`` of the first day the stored series disagrees
+        # with: a late-uploaded ride, a new day, or a different calendar start
+        stored = self.load()
+        if stored.empty or stored.index[0] != tss.index[0]:
+            return 0
+        common = min(len(stored), len(tss))
+        differs = np.flatnonzero(
+            stored["tss"].values[:common] != tss.values[:common].astype("float64")
+        )
+        if len(differs):
+            return int(differs[0])
+        if len(tss) > len(stored):
+            return common
+        if len(tss) < len(stored):
+            # Calendar got shorter; nothing to recompute, just trim
+            return len(tss)
+        return None
+
+    def update(self, tss: pd.Series) -> int:
+        # ``tss`` is daily training stress indexed by date, rest days zero.
+        # Only days from the first change onwards are recomputed, seeded from
+        # the stored loads of the day before.
+        with self.lock:
+            tss = tss.astype("float64")
+            start = self.first_change(tss)
+            if start is None:
+                return 0
+            stored = self.load()
+
+            ctl = np.empty(len(tss) - start)
+            atl = np.empty(len(tss) - start)
+            tsb = np.empty(len(tss) - start)
+            if start:
+                prev_ctl = stored["CTL"].values[start - 1]
+                prev_atl = stored["ATL"].values[start - 1]
+            else:
+                prev_ctl = prev_atl = 0.0
+            for i, load in enumerate(tss.values[start:].tolist()):
+                # Form is yesterday's fitness minus yesterday's fatigue
+                tsb[i] = prev_ctl - prev_atl
+                prev_ctl += (load - prev_ctl) / CTL_DAYS
+                prev_atl += (load - prev_atl) / ATL_DAYS
+                ctl[i] = prev_ctl
+                atl[i] = prev_atl
+
+            tail = pd.DataFrame(
+                {"tss": tss.values[start:], "CTL": ctl, "ATL": atl, "TSB": tsb},
+                index=pd.DatetimeIndex(tss.index[start:], name="date"),
+            )
+            self.series = pd.concat([stored.iloc[:start], tail])
+            self.save()
+            return len(tail)
+
+    def range(self, start_dt: str, end_dt: str) -> pd.DataFrame:
+        window = self.load().loc[str(start_dt)[:10] : str(end_dt)[:10]]
+        return window.rename_axis("timestamp").reset_index()
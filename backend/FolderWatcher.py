@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+WATCHED_SUFFIXES = (".fit", ".zip")
+
+
+class FolderWatcher:
+    """Polls ``path`` for new or changed ride files and calls ``on_change`` once
+    the folder has been quiet for ``debounce`` seconds.
+
+    Polling is one directory scan per ``interval``, which keeps it portable
+    (no inotify/FSEvents dependency) and cheap next to a FIT decode. The
+    debounce lets a browser download or a zip extraction finish before the
+    files are read."""
+
+    def __init__(
+        self,
+        path: str,
+        on_change: Callable[[], None],
+        interval: float = 5.0,
+        debounce: float = 10.0,
+    ):
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self.debounce = debounce
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def snapshot(self) -> Dict[str, Tuple[int, int]]:
+        if not os.path.isdir(self.path):
+            return {}
+        entries = {}
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if entry.name.lower().endswith(WATCHED_SUFFIXES) and entry.is_file():
+                    stat = entry.stat()
+                    entries[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return entries
+
+    def has_new_files(self, before: dict, after: dict) -> bool:
+        # Removals don't matter; archives are deleted once they're ingested
+        return any(before.get(name) != stat for name, stat in after.items())
+
+    def run(self) -> None:
+        seen = self.snapshot()
+        pending = None
+        changed_at = 0.0
+        while not self.stop_event.wait(self.interval):
+            current = self.snapshot()
+            if pending is None:
+                if self.has_new_files(seen, current):
+                    pending, changed_at = current, time.monotonic()
+                continue
+            if current != pending:
+                # Still being written to; restart the quiet period
+                pending, changed_at = current, time.monotonic()
+                continue
+            if time.monotonic() - changed_at < self.debounce:
+                continue
+            try:
+                self.on_change()
+            except Exception as e:
+                print(f"Error ingesting new files: {str(e)}")
+            # Whatever the ingest left behind (e.g. archives it deleted) is
+            # the new baseline
+            seen, pending = self.snapshot(), None
+
+    def start(self) -> None:
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_event.clear()
+            self.thread = threading.Thread(
+                target=self.run, name="folder-watcher", daemon=True
+            )
+            self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
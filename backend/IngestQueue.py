@@ -0,0 +1,53 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, List
+
+
+class IngestQueue:
+    """Runs ``run(key)`` for submitted keys one at a time on a worker thread.
+
+    A key that is already waiting isn't queued twice, so a burst of folder
+    changes for one athlete costs one ingest and can't starve the others.
+    Decoding already fans out over a process pool, so one ingest at a time
+    keeps the machine busy without athletes competing for it."""
+
+    def __init__(self, run: Callable[[str], None]):
+        self.run = run
+        self.waiting = OrderedDict()
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.thread = None
+
+    def submit(self, key: str) -> None:
+        with self.condition:
+            self.waiting[key] = True
+            self.condition.notify()
+
+    def pending(self) -> List[str]:
+        with self.condition:
+            return list(self.waiting)
+
+    def worker(self) -> None:
+        while True:
+            with self.condition:
+                while not self.waiting and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                key, _ = self.waiting.popitem(last=False)
+            try:
+                self.run(key)
+            except Exception as e:
+                print(f"Ingest for {key} failed: {str(e)}")
+
+    def start(self) -> None:
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self.worker, name="ingest-queue", daemon=True
+            )
+            self.thread.start()
+
+    def stop(self) -> None:
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.RecordStore import RECORD_COLUMNS, RecordStore
+
+
+class PowerCurveEngine:
+    """Mean-maximal power curves, computed once per ride from its records and
+    cached under ``cache_path``; range queries combine the cached curves."""
+
+    def __init__(self, record_store: RecordStore, cache_path: str):
+        self.records = record_store
+        self.cache_path = cache_path
+        self.index_path = os.path.join(cache_path, "index.json")
+        self.index = None
+        self.curves = {}
+        self.lock = threading.RLock()
+
+    def load_index(self) -> dict:
+        if self.index is None:
+            if os.path.exists(self.index_path):
+                with open(self.index_path) as f:
+                    self.index = json.load(f)
+            else:
+                self.index = {}
+        return self.index
+
+    def unload(self) -> None:
+        # Both are read back from cache_path on next use
+        with self.lock:
+            self.index = None
+            self.curves = {}
+
+    def memory_bytes(self) -> int:
+        # Curves loaded from the cache are memory maps; only ones computed
+        # in this process are held on the heap
+        return sum(
+            curve.nbytes
+            for curve in list(self.curves.values())
+            if not isinstance(curve, np.memmap)
+        )
+
+    def save_index(self) -> None:
+        os.makedirs(self.cache_path, exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.load_index(), f)
+        os.replace(tmp_path, self.index_path)
+
+    def power_series(self, timestamps: np.ndarray, power: np.ndarray) -> np.ndarray:
+        # One sample per second from the first record to the last; gaps
+        # (auto-pause, dropouts) and missing power count as zero watts
+        ts_missing = RECORD_COLUMNS["timestamp"][1]
+        power_missing = RECORD_COLUMNS["power"][1]
+        valid = timestamps != ts_missing
+        timestamps = timestamps[valid].astype("int64")
+        if not len(timestamps):
+            return np.zeros(0, dtype="int64")
+        power = np.where(power[valid] == power_missing, 0, power[valid])
+        offsets = timestamps - timestamps.min()
+        series = np.zeros(offsets.max() + 1, dtype="int64")
+        series[offsets] = power
+        return series
+
+    def ride_curve(self, power: np.ndarray) -> np.ndarray:
+        # curve[d - 1] is the best average power over any d consecutive seconds.
+        # Every window sum of length d is one vectorised difference of the
+        # cumulative sum, so the whole curve is n passes over the ride.
+        n = len(power)
+        if not n:
+            return np.zeros(0, dtype="float32")
+        cumulative = np.concatenate(([0], np.cumsum(power, dtype="int64")))
+        window = np.empty(n, dtype="int64")
+        best = np.empty(n, dtype="int64")
+        for d in range(1, n + 1):
+            m = n + 1 - d
+            np.subtract(cumulative[d:], cumulative[:m], out=window[:m])
+            best[d - 1] = window[:m].max()
+        return (best / np.arange(1, n + 1)).astype("float32")
+
+    def ride_date(self, ride_key: str) -> Optional[str]:
+        try:
+            return str(pd.Timestamp(ride_key).date())
+        except (ValueError, TypeError):
+            # Content-hash keys carry no start time
+            return None
+
+    def update(self) -> int:
+        # Compute and cache a curve for every ride whose records arrived since
+        # the last run
+        with self.lock:
+            index = self.load_index()
+            added = 0
+            for ride_key in self.records.rides():
+                if ride_key in index:
+                    continue
+                ride_date = self.ride_date(ride_key)
+                if ride_date is None:
+                    continue
+                records = self.records.load_ride(ride_key, ["timestamp", "power"])
+                curve = self.ride_curve(
+                    self.power_series(records["timestamp"], records["power"])
+                )
+                file_name = hashlib.sha1(ride_key.encode()).hexdigest()[:16] + ".npy"
+                os.makedirs(self.cache_path, exist_ok=True)
+                np.save(os.path.join(self.cache_path, file_name), curve)
+                index[ride_key] = {
+                    "file": file_name,
+                    "date": ride_date,
+                    "seconds": len(curve),
+                }
+                self.curves[ride_key] = curve
+                added += 1
+            if added:
+                self.save_index()
+            return added
+
+    def curve(self, ride_key: str) -> np.ndarray:
+        # Kept in a local so an unload() between the lines can't lose it
+        curve = self.curves.get(ride_key)
+        if curve is None:
+            entry = self.load_index()[ride_key]
+            curve = np.load(os.path.join(self.cache_path, entry["file"]), mmap_mode="r")
+            self.curves[ride_key] = curve
+        return curve
+
+    def rides_between(
+        self, start_date: Optional[str] = None, end_date: Optional[str] = None
+    ) -> List[str]:
+        start_date = str(start_date)[:10] if start_date else "0000-00-00"
+        end_date = str(end_date)[:10] if end_date else "9999-99-99"
+        return [
+            ride_key
+            for ride_key, entry in self.load_index().items()
+            if start_date <= entry["date"] <= end_date
+        ]
+
+    def best_curve(
+        self, start_date: Optional[str] = None, end_date: Optional[str] = None
+    ) -> np.ndarray:
+        # Element-wise max of the cached ride curves in the range; a shorter
+        # ride only competes for the durations it actually covers
+        with self.lock:
+            ride_keys = self.rides_between(start_date, end_date)
+            if not ride_keys:
+                return np.zeros(0, dtype="float32")
+            length = max(self.load_index()[k]["seconds"] for k in ride_keys)
+            best = np.zeros(length, dtype="float32")
+            for ride_key in ride_keys:
+                curve = self.curve(ride_key)
+                np.maximum(best[: len(curve)], curve, out=best[: len(curve)])
+            return best
+
+    def season_curves(self) -> Dict[int, np.ndarray]:
+        years = sorted({int(e["date"][:4]) for e in self.load_index().values()})
+        return {
+            year: self.best_curve(f"{year}-01-01", f"{year}-12-31") for year in years
+        }
@@ -0,0 +1,136 @@
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.StageTimer import stage_timer
+
+# Daily table columns kept as running totals
+PREFIX_SUM_COLUMNS = [
+    "Distance_miles",
+    "total_timer_time",
+    "training_stress_score",
+    "Kjs",
+    "total_ascent_feet",
+    "total_descent_feet",
+    "rides",
+]
+
+# Bucket name -> numpy datetime unit; weeks are handled separately since
+# numpy weeks start on Thursdays
+PERIODS = {"year": "datetime64[Y]", "month": "datetime64[M]"}
+
+
+@stage_timer.timed_methods
+class PrefixSums:
+    """Running totals of the daily table, so the total over any date range
+    is one subtraction and calendar buckets are a vectorized difference at
+    their boundaries.
+
+    ``cumulative`` has one row per day starting with a zero row the day
+    before the first ride; each row holds the totals up to and including its
+    day. It is replaced, never modified, so frames handed out stay valid."""
+
+    def __init__(self, cumulative: Optional[pd.DataFrame] = None):
+        self.cumulative = cumulative
+        # Daily values the running totals were built from, to find where an
+        # updated table first differs
+        self.daily_values = None
+
+    def first_change(self, daily: pd.DataFrame, values: np.ndarray) -> Optional[int]:
+        stored = self.cumulative
+        if self.daily_values is None or stored.index[1] != daily.index[0]:
+            return 0
+        common = min(len(self.daily_values), len(values))
+        differs = np.flatnonzero(
+            (self.daily_values[:common] != values[:common]).any(axis=1)
+        )
+        if len(differs):
+            return int(differs[0])
+        if len(values) != len(self.daily_values):
+            return common
+        return None
+
+    def update(self, daily: pd.DataFrame) -> int:
+        # Running totals are only recomputed from the first changed day,
+        # continuing from the total of the day before
+        values = daily[PREFIX_SUM_COLUMNS].to_numpy("float64")
+        start = self.first_change(daily, values)
+        if start is None:
+            return 0
+        if start:
+            head = self.cumulative.iloc[: start + 1]
+        else:
+            head = pd.DataFrame(
+                np.zeros((1, len(PREFIX_SUM_COLUMNS))),
+                index=pd.DatetimeIndex(
+                    [daily.index[0] - pd.Timedelta(days=1)], name="date"
+                ),
+                columns=PREFIX_SUM_COLUMNS,
+            )
+        tail = pd.DataFrame(
+            head.values[-1] + np.cumsum(values[start:], axis=0),
+            index=pd.DatetimeIndex(daily.index[start:], name="date"),
+            columns=PREFIX_SUM_COLUMNS,
+        )
+        self.cumulative = pd.concat([head, tail])
+        self.daily_values = values
+        return len(tail)
+
+    def bounds(self, start_dt=None, end_dt=None) -> tuple:
+        # The requested range clipped to the days the table covers, as
+        # numpy days
+        index = self.cumulative.index
+        first = index[1].to_datetime64().astype("datetime64[D]")
+        last = index[-1].to_datetime64().astype("datetime64[D]")
+        start = max(np.datetime64(str(start_dt)[:10]), first) if start_dt else first
+        end = min(np.datetime64(str(end_dt)[:10]), last) if end_dt else last
+        return start, end
+
+    def positions(self, days: np.ndarray) -> np.ndarray:
+        # Row holding the totals up to and including each day
+        origin = self.cumulative.index[0].to_datetime64().astype("datetime64[D]")
+        offsets = (days - origin).astype("int64")
+        return np.clip(offsets, 0, len(self.cumulative) - 1)
+
+    def total(self, start_dt=None, end_dt=None) -> pd.Series:
+        start, end = self.bounds(start_dt, end_dt)
+        if start > end:
+            return pd.Series(0.0, index=PREFIX_SUM_COLUMNS)
+        before, through = self.positions(np.array([start - 1, end]))
+        values = self.cumulative.values
+        # Rounding drops the cancellation error of subtracting large totals
+        return pd.Series(
+            np.round(values[through] - values[before], 6), index=PREFIX_SUM_COLUMNS
+        )
+
+    def buckets(
+        self, start_dt=None, end_dt=None, period: str = "month"
+    ) -> pd.DataFrame:
+        # Totals per calendar year, month or Monday-Sunday week overlapping
+        # the range, indexed by each bucket's first day; the first and last
+        # buckets only count the days inside the range
+        start, end = self.bounds(start_dt, end_dt)
+        if start > end:
+            return pd.DataFrame(
+                columns=PREFIX_SUM_COLUMNS,
+                index=pd.DatetimeIndex([], name="date"),
+                dtype="float64",
+            )
+        if period == "week":
+            # Days since the Monday 1970-01-05, modulo a week
+            monday = start - (start - np.datetime64("1970-01-05")).astype("int64") % 7
+            firsts = np.arange(monday, end + 1, 7)
+        else:
+            unit = PERIODS[period]
+            firsts = np.arange(start.astype(unit), end.astype(unit) + 1).astype(
+                "datetime64[D]"
+            )
+        # Each bucket runs from the day after one edge through the next
+        edges = self.positions(np.concatenate([[start - 1], firsts[1:] - 1, [end]]))
+        values = self.cumulative.values[edges]
+        return pd.DataFrame(
+            np.round(np.diff(values, axis=0), 6),
+            index=pd.DatetimeIndex(firsts.astype("datetime64[ns]"), name="date"),
+            columns=PREFIX_SUM_COLUMNS,
+        )
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Column name -> (dtype, missing-value sentinel). Integer sentinels are the FIT
+# "invalid" values for the matching base type.
+RECORD_COLUMNS = {
+    "timestamp": ("uint32", 0xFFFFFFFF),
+    "power": ("uint16", 0xFFFF),
+    "heart_rate": ("uint8", 0xFF),
+    "cadence": ("uint8", 0xFF),
+    "speed": ("float32", np.nan),
+    "distance": ("float32", np.nan),
+    "altitude": ("float32", np.nan),
+    "position_lat": ("int32", 0x7FFFFFFF),
+    "position_long": ("int32", 0x7FFFFFFF),
+}
+
+
+def records_to_columns(records: list) -> Dict[str, np.ndarray]:
+    # record_mesgs dicts -> typed column arrays; the enhanced_* fields carry
+    # the full range on newer devices so they win over the legacy ones
+    values = {name: [] for name in RECORD_COLUMNS}
+    for record in records:
+        for name in RECORD_COLUMNS:
+            if name == "timestamp":
+                value = record.get("timestamp")
+                value = None if value is None else int(value.timestamp())
+            elif name in ("speed", "altitude"):
+                value = record.get("enhanced_" + name, record.get(name))
+            else:
+                value = record.get(name)
+            values[name].append(value)
+
+    columns = {}
+    for name, (dtype, missing) in RECORD_COLUMNS.items():
+        filled = [missing if v is None else v for v in values[name]]
+        columns[name] = np.array(filled, dtype="float64").astype(dtype)
+    return columns
+
+
+class RecordStore:
+    """Per-second record columns, one binary file per ride under ``store_path``.
+
+    Each ride file holds its columns back to back; ``index.json`` maps a
+    session key to the file, row count and the dtype/byte offset of every
+    column, so a ride loads as read-only memory maps without copying."""
+
+    def __init__(self, store_path: str):
+        self.store_path = store_path
+        self.index_path = os.path.join(store_path, "index.json")
+        self.index = None
+        self.lock = threading.RLock()
+
+    def load_index(self) -> dict:
+        if self.index is None:
+            if os.path.exists(self.index_path):
+                with open(self.index_path) as f:
+                    self.index = json.load(f)
+            else:
+                self.index = {}
+        return self.index
+
+    def unload(self) -> None:
+        # Only called between ingests, once new rides' entries are saved
+        with self.lock:
+            self.index = None
+
+    def save_index(self) -> None:
+        with self.lock:
+            os.makedirs(self.store_path, exist_ok=True)
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.load_index(), f)
+            os.replace(tmp_path, self.index_path)
+
+    def rides(self) -> List[str]:
+        return list(self.load_index())
+
+    def has_ride(self, ride_key: str) -> bool:
+        return ride_key in self.load_index()
+
+    def write_ride(self, ride_key: str, columns: Dict[str, np.ndarray]) -> None:
+        rows = len(columns["timestamp"])
+        file_name = hashlib.sha1(ride_key.encode()).hexdigest()[:16] + ".bin"
+        layout = {}
+        offset = 0
+        with self.lock:
+            os.makedirs(self.store_path, exist_ok=True)
+            tmp_path = os.path.join(self.store_path, file_name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                for name, (dtype, _) in RECORD_COLUMNS.items():
+                    array = np.ascontiguousarray(columns[name], dtype=dtype)
+                    # Keep every column 8-byte aligned inside the file
+                    padding = -offset % 8
+                    f.write(b"\0" * padding)
+                    offset += padding
+                    layout[name] = [dtype, offset]
+                    f.write(array.tobytes())
+                    offset += array.nbytes
+            os.replace(tmp_path, os.path.join(self.store_path, file_name))
+            self.load_index()[ride_key] = {
+                "file": file_name,
+                "rows": rows,
+                "columns": layout,
+            }
+
+    def load_ride(
+        self, ride_key: str, columns: Optional[List[str]] = None
+    ) -> Dict[str, np.ndarray]:
+        entry = self.load_index()[ride_key]
+        path = os.path.join(self.store_path, entry["file"])
+        wanted = columns or list(entry["columns"])
+        if entry["rows"] == 0:
+            return {
+                name: np.empty(0, dtype=entry["columns"][name][0]) for name in wanted
+            }
+        return {
+            name: np.memmap(
+                path,
+                dtype=entry["columns"][name][0],
+                mode="r",
+                offset=entry["columns"][name][1],
+                shape=(entry["rows"],),
+            )
+            for name in wanted
+        }
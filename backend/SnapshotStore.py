@@ -0,0 +1,100 @@
+import os
+import shutil
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+
+from backend.StageTimer import stage_timer
+
+# "publish" in the ingest process, "read" in serving workers; unset runs both
+# in one process without snapshots
+SNAPSHOT_MODE_ENV = "CYCLING_DASH_SNAPSHOT_MODE"
+
+
+def snapshot_mode() -> Optional[str]:
+    return os.environ.get(SNAPSHOT_MODE_ENV) or None
+
+
+@stage_timer.timed_methods
+class SnapshotStore:
+    """An athlete's derived frames written as uncompressed Arrow IPC files,
+    one directory per data version under ``snapshot_path``, with ``CURRENT``
+    naming the latest. Readers memory-map the files, so every worker on the
+    machine shares the same page-cache pages, and switch version by reading
+    ``CURRENT``, which is replaced atomically once a version is complete."""
+
+    def __init__(self, snapshot_path: str, keep: int = 3):
+        self.snapshot_path = snapshot_path
+        self.current_path = os.path.join(snapshot_path, "CURRENT")
+        # Old versions are kept for a while since workers may still map them
+        self.keep = keep
+
+    def current_version(self) -> Optional[str]:
+        try:
+            with open(self.current_path) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def publish(self, views: dict, version: str) -> None:
+        version_path = os.path.join(self.snapshot_path, version)
+        if not os.path.exists(version_path):
+            tmp_path = f"{version_path}.{os.getpid()}.tmp"
+            os.makedirs(tmp_path, exist_ok=True)
+            for name, frame in views.items():
+                if not isinstance(frame, pd.DataFrame):
+                    continue
+                table = self.to_table(frame)
+                with pa.OSFile(os.path.join(tmp_path, f"{name}.arrow"), "wb") as sink:
+                    with pa.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table)
+            os.replace(tmp_path, version_path)
+
+        tmp_current = f"{self.current_path}.{os.getpid()}.tmp"
+        with open(tmp_current, "w") as f:
+            f.write(version)
+        os.replace(tmp_current, self.current_path)
+        self.prune(version)
+
+    def to_table(self, df: pd.DataFrame) -> pa.Table:
+        # Display tables mix numbers and strings in one column; like the
+        # activity store, such columns are written as strings
+        mixed = []
+        for col in df.columns[df.dtypes == object]:
+            try:
+                pa.array(df[col], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                mixed.append(col)
+        if mixed:
+            df = df.assign(
+                **{
+                    col: df[col].map(lambda v: v if v is None else str(v))
+                    for col in mixed
+                }
+            )
+        return pa.Table.from_pandas(df)
+
+    def read(self, version: str) -> dict:
+        # Numeric columns without nulls come back as views over the mapped
+        # pages; strings and other object columns are copied per worker
+        version_path = os.path.join(self.snapshot_path, version)
+        views = {}
+        for f in sorted(os.listdir(version_path)):
+            if f.endswith(".arrow"):
+                source = pa.memory_map(os.path.join(version_path, f), "r")
+                table = pa.ipc.open_file(source).read_all()
+                views[f[: -len(".arrow")]] = table.to_pandas(split_blocks=True)
+        return views
+
+    def prune(self, current: str) -> None:
+        versions = [
+            entry
+            for entry in os.scandir(self.snapshot_path)
+            if entry.is_dir() and entry.name != current
+        ]
+        versions.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in versions[self.keep - 1 :]:
+            # Mapped files stay readable after unlinking, so this is safe
+            # even under a worker still serving that version
+            shutil.rmtree(entry.path, ignore_errors=True)
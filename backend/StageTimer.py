@@ -0,0 +1,134 @@
+import contextlib
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+import numpy as np
+
+# Timing is off unless this is set to something other than "0"; when off the
+# decorators hand back the original functions and span() is a shared no-op
+TIMING_ENV = "CYCLING_DASH_TIMING"
+
+
+class StageTimer:
+    """Named spans with call counts, total time, p50/p95 latency and row
+    counts. Latency percentiles come from the most recent ``max_samples``
+    calls of each stage."""
+
+    def __init__(self, enabled: Optional[bool] = None, max_samples: int = 1024):
+        if enabled is None:
+            enabled = os.environ.get(TIMING_ENV, "0") not in ("", "0")
+        self.enabled = enabled
+        self.max_samples = max_samples
+        self.stages = {}
+        self.lock = threading.Lock()
+        self.null_span = contextlib.nullcontext({})
+
+    def record(self, name: str, seconds: float, rows: Optional[int] = None) -> None:
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = {
+                    "count": 0,
+                    "total": 0.0,
+                    "rows": None,
+                    "samples": deque(maxlen=self.max_samples),
+                }
+            stage["count"] += 1
+            stage["total"] += seconds
+            stage["samples"].append(seconds)
+            if rows is not None:
+                stage["rows"] = (stage["rows"] or 0) + rows
+
+    def span(self, name: str):
+        # with stage_timer.span("decode") as span: ...; span["rows"] = n
+        if not self.enabled:
+            return self.null_span
+        return self._span(name)
+
+    @contextlib.contextmanager
+    def _span(self, name: str):
+        info = {}
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            self.record(name, time.perf_counter() - start, info.get("rows"))
+
+    def timed(self, name: Optional[str] = None) -> Callable:
+        # Decorator; the row count is the length of a returned list, frame or
+        # array
+        def decorator(func: Callable) -> Callable:
+            if not self.enabled:
+                return func
+            stage = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                result = func(*args, **kwargs)
+                rows = None
+                if isinstance(result, list):
+                    rows = len(result)
+                elif getattr(result, "shape", None):
+                    rows = result.shape[0]
+                self.record(stage, time.perf_counter() - start, rows)
+                return result
+
+            return wrapper
+
+        return decorator
+
+    def timed_methods(self, cls: type) -> type:
+        # Class decorator timing every public method. Generator methods are
+        # left alone since timing them would only measure creating the
+        # generator.
+        if not self.enabled:
+            return cls
+        for attr, func in list(vars(cls).items()):
+            if (
+                attr.startswith("_")
+                or not inspect.isfunction(func)
+                or inspect.isgeneratorfunction(func)
+            ):
+                continue
+            setattr(cls, attr, self.timed(f"{cls.__name__}.{attr}")(func))
+        return cls
+
+    def stats(self) -> dict:
+        with self.lock:
+            stages = {
+                name: (
+                    stage["count"],
+                    stage["total"],
+                    stage["rows"],
+                    list(stage["samples"]),
+                )
+                for name, stage in self.stages.items()
+            }
+        out = {}
+        for name, (count, total, rows, samples) in sorted(
+            stages.items(), key=lambda item: -item[1][1]
+        ):
+            p50, p95 = np.percentile(samples, [50, 95]) * 1000
+            out[name] = {
+                "count": count,
+                "total_s": round(total, 4),
+                "p50_ms": round(float(p50), 3),
+                "p95_ms": round(float(p95), 3),
+                "rows": rows,
+            }
+        return out
+
+    def dump(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump({"enabled": self.enabled, "stages": self.stats()}, f, indent=2)
+
+
+# Shared by the backend classes and the Dash callbacks
+stage_timer = StageTimer()
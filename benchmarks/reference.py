@@ -0,0 +1,54 @@
+# The per-session loop normalize_sessions() replaced, kept unchanged so the
+# batch version can be checked against it (run_benchmarks.check_normalize_sessions)
+from datetime import timedelta
+
+from pytz import timezone
+
+
+def session_to_row(dic: dict) -> dict:
+    new_dict = {}
+    for k, v in dic.items():
+        if not str(k).isdigit():
+            if k == "timestamp":
+                tz_denver = timezone("America/Denver")
+                v_denver = v.astimezone(tz_denver)
+                new_dict[str(k)] = str(v_denver.date())
+                new_dict["yr"] = v_denver.year
+                new_dict["week_num"] = v_denver.isocalendar().week
+                new_dict["mnth"] = v_denver.month
+                new_dict["week_num_yr"] = (
+                    f"{v_denver.year}_{v_denver.isocalendar().week}"
+                )
+                new_dict["yrmo"] = int(v_denver.year * 100 + v_denver.month)
+            elif k == "start_time":
+                new_dict[str(k)] = str(v.astimezone(timezone("America/Denver")))
+            elif k == "total_distance":
+                new_dict["Distance_miles"] = (v / 1000) * 0.621371
+            elif k == "total_elapsed_time":
+                new_dict["RidingTime"] = str(timedelta(seconds=round(v)))
+            elif k == "total_timer_time":
+                new_dict[k] = v
+                new_dict["PedalTime"] = str(timedelta(seconds=round(v)))
+            elif k == "total_ascent":
+                new_dict["total_ascent_feet"] = v * 3.28084
+            elif k == "total_descent":
+                new_dict["total_descent_feet"] = v * 3.28084
+            elif k == "avg_temperature":
+                new_dict["avg_temp_f"] = round((v * 9 / 5) + 32)
+            elif k == "avg_speed":
+                new_dict["avg_MPH"] = v * 2.23694
+            elif k == "total_work":
+                new_dict["Kjs"] = v / 1000
+            elif k == "left_right_balance":
+                right_pct = v / (32768 + v)
+                left_pct = 1 - right_pct
+                new_dict["PowerBalance"] = f"{right_pct:.0%} R | {left_pct:.0%} L"
+            else:
+                new_dict[str(k)] = v
+    try:
+        new_dict.pop("total_grit")
+        new_dict.pop("avg_flow")
+    except:
+        print("File Load Error")
+        pass
+    return new_dict
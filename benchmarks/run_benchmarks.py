@@ -0,0 +1,448 @@
+"""Time the processor, store and figure builders on synthetic ride histories.
+
+    python -m benchmarks.run_benchmarks --sessions 1000 10000
+    python -m benchmarks.run_benchmarks --save-baseline
+    python -m benchmarks.run_benchmarks --sessions 100000 --fit-files 0
+
+Each benchmark reports the best wall time over ``--repeat`` runs and the peak
+traced allocation (tracemalloc, measured in a separate run so tracing doesn't
+skew the timings). Results are compared against benchmarks/baseline.json and
+the run exits non-zero when anything got slower or hungrier than the baseline
+by more than ``--tolerance``. It also fails when normalize_sessions stops
+matching the per-session loop in benchmarks/reference.py, when weekly
+totals stop being Monday-Sunday weeks labelled by their Monday, or when an
+upsert after a torn ride-log line loses rides.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from backend.ActivityStore import ActivityStore, session_key
+from backend.CyclingDataProcessor import CyclingDataProcessor, normalize_sessions
+from backend.PrefixSums import PrefixSums
+from backend.RecordStore import RecordStore
+from benchmarks.reference import session_to_row
+from benchmarks.synthetic import default_span, generate_fit_files, generate_sessions
+from frontend.CyclingDataVisualizer import CyclingDataVisualizer
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def make_processor(root: str) -> CyclingDataProcessor:
+    # A processor whose download folder and data files live under ``root``
+    processor = CyclingDataProcessor()
+    processor.download_path = os.path.join(root, "downloads") + os.sep
+    processor.data_files_path = os.path.join(root, "data") + os.sep
+    processor.processed_files_path = os.path.join(
+        processor.data_files_path, "processed_files.json"
+    )
+    processor.manifest = {}
+    processor.store = ActivityStore(
+        os.path.join(processor.data_files_path, "activities")
+    )
+    processor.records = RecordStore(os.path.join(processor.data_files_path, "records"))
+    os.makedirs(processor.download_path, exist_ok=True)
+    os.makedirs(processor.data_files_path, exist_ok=True)
+    return processor
+
+
+def measure(
+    func: Callable[[], object],
+    repeat: int,
+    setup: Callable[[], None] = None,
+) -> Dict[str, float]:
+    # Best-of-N wall time, then one traced run for peak memory. The code under
+    # test prints progress, which is kept out of the results table.
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+
+        if setup:
+            setup()
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return {"seconds": round(min(times), 6), "peak_mb": round(peak / 2**20, 3)}
+
+
+def check_normalize_sessions(n: int, args: argparse.Namespace) -> List[str]:
+    # normalize_sessions must keep matching the per-session loop it replaced
+    # byte for byte. Variants with dropped fields, half-second durations and
+    # other balance values cover the other key layouts and rounding cases.
+    rng = random.Random(args.seed)
+    sessions = generate_sessions(n, *default_span(args.years), seed=args.seed)
+    for session in sessions[: n // 4]:
+        variant = dict(session)
+        for key in rng.sample(sorted(variant), 3):
+            del variant[key]
+        if "total_timer_time" in variant:
+            variant["total_timer_time"] += 0.5
+        if "left_right_balance" in variant:
+            variant["left_right_balance"] = rng.randrange(0, 2**16)
+        sessions.append(variant)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = [session_to_row(session) for session in sessions]
+        actual = normalize_sessions(sessions)
+    mismatches = sum(
+        json.dumps(a, default=str) != json.dumps(e, default=str)
+        for a, e in zip(actual, expected)
+    )
+    if mismatches or len(actual) != len(expected):
+        return [f"{n} normalize_sessions: {mismatches} of {len(expected)} rows differ"]
+    return []
+
+
+def check_weekly_totals(n: int, args: argparse.Namespace) -> List[str]:
+    # Weeks run Monday to Sunday and are labelled by their Monday, on both
+    # the per-row and the running-total paths and in the current month's
+    # summary. A Sunday and the Monday after it pin the boundary: 2024-01-07
+    # is in the week of Jan 01, 2024-01-08 starts the next.
+    processor = CyclingDataProcessor()
+    rows = normalize_sessions(
+        generate_sessions(n, *default_span(args.years), seed=args.seed)
+    )
+    pinned = [dict(rows[0], timestamp=day) for day in ("2024-01-07", "2024-01-08")]
+    failures = []
+    for name, sample, expected in (
+        ("pinned", pinned, ["Mon, Jan 08, 2024", "Mon, Jan 01, 2024"]),
+        (str(n), rows, None),
+    ):
+        with contextlib.redirect_stdout(io.StringIO()):
+            all_data_df = processor.schema.apply(pd.DataFrame(sample))
+        sums = PrefixSums()
+        sums.update(processor.create_daily_table(all_data_df))
+        by_row = processor.get_weekly_totals(all_data_df).reset_index(drop=True)
+        by_sums = processor.get_weekly_totals(sums).reset_index(drop=True)
+        columns = ["year_week", "week_start", "Distance_miles", "hours"]
+        if not by_row[columns].equals(by_sums[columns]):
+            failures.append(f"{name} get_weekly_totals: row and prefix weeks differ")
+        if not by_row["week_start"].str.startswith("Mon,").all():
+            failures.append(f"{name} get_weekly_totals: a week doesn't start Monday")
+        if expected is None:
+            continue
+        if by_row["week_start"].tolist() != expected:
+            failures.append(
+                f"{name} get_weekly_totals: weeks {by_row['week_start'].tolist()}"
+            )
+
+        # January 2024 runs Monday Jan 01 to Wednesday Jan 31, so five weeks;
+        # the two pinned rides land in the first two
+        month = processor.get_current_month_weekly_summary(
+            sums, today=date(2024, 1, 10)
+        )
+        weeks = month["week_range"].tolist()
+        if (month["week_start"].dt.weekday != 0).any() or weeks != [
+            "Jan 01 - Jan 07",
+            "Jan 08 - Jan 14",
+            "Jan 15 - Jan 21",
+            "Jan 22 - Jan 28",
+            "Jan 29 - Feb 04",
+        ]:
+            failures.append(f"get_current_month_weekly_summary: weeks {weeks}")
+        elif (
+            not (month["Distance"].values[:2] > 0).all()
+            or month["Distance"].values[2:].any()
+        ):
+            failures.append("get_current_month_weekly_summary: rides in the wrong week")
+    return failures
+
+
+def check_torn_log(args: argparse.Namespace) -> List[str]:
+    # A crash mid-append leaves a partial last line in the ride log; the next
+    # upsert must not glue its first record onto it
+    root = tempfile.mkdtemp(prefix="cycling-torn-log-")
+    try:
+        rows = normalize_sessions(
+            generate_sessions(10, *default_span(args.years), seed=args.seed)
+        )
+        store = ActivityStore(os.path.join(root, "activities"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            store.upsert(rows[:5])
+            with open(store.log_path, "a") as f:
+                f.write('{"key": "torn", "hash": ')
+            store.upsert(rows[5:])
+            # A fresh store sees only what is on disk
+            logged = {
+                record["key"] for record in ActivityStore(store.store_path).read_log()
+            }
+        missing = [row for row in rows if session_key(row) not in logged]
+        if missing:
+            return [f"torn log: {len(missing)} of {len(rows)} rides lost"]
+        return []
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def run_scale(n: int, args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    start, end = default_span(args.years)
+    root = tempfile.mkdtemp(prefix=f"cycling-bench-{n}-")
+    results = {}
+
+    def bench(name: str, func: Callable, setup: Callable = None) -> None:
+        results[name] = measure(func, args.repeat, setup)
+        print(
+            f"  {name:40s} {results[name]['seconds'] * 1000:10.2f} ms"
+            f" {results[name]['peak_mb']:10.2f} MB"
+        )
+
+    try:
+        print(f"{n} sessions over {args.years:g} years")
+        processor = make_processor(root)
+        visualizer = CyclingDataVisualizer()
+        raw = generate_sessions(n, start, end, seed=args.seed)
+
+        # Ingest
+        if args.fit_files:
+            generate_fit_files(
+                processor.download_path,
+                args.fit_files,
+                start,
+                end,
+                seconds=args.fit_seconds,
+                seed=args.seed,
+            )
+
+            def reset_manifest():
+                processor.manifest = {}
+                processor.pending_manifest = {}
+
+            bench(
+                f"process_new_files[{args.fit_files} files]",
+                processor.process_new_files,
+                reset_manifest,
+            )
+
+        bench("normalize_sessions", lambda: normalize_sessions(raw))
+        bench(
+            "session_to_row[reference]",
+            lambda: [session_to_row(session) for session in raw],
+        )
+        rows = normalize_sessions(raw)
+        half = len(rows) // 2
+        bench(
+            "create_new_file",
+            lambda: processor.create_new_file(rows[half:], rows[:half]),
+        )
+
+        # Storage
+        def empty_store():
+            shutil.rmtree(processor.store.store_path, ignore_errors=True)
+            processor.store = ActivityStore(processor.store.store_path)
+
+        bench("write_out_file", lambda: processor.write_out_file(rows), empty_store)
+        bench(
+            "compact",
+            processor.compact,
+            lambda: (empty_store(), processor.write_out_file(rows)),
+        )
+        bench("load_activities", processor.load_activities)
+        untyped = processor.store.read()
+        bench("ActivitySchema.apply", lambda: processor.schema.apply(untyped))
+
+        snapshot = os.path.join(processor.data_files_path, "HL_Summary_bench.json")
+        with open(snapshot, "w") as f:
+            json.dump(rows, f)
+        bench("read_existing_files", processor.read_existing_files)
+
+        # Aggregations
+        all_data_df = processor.load_activities()
+        min_date = pd.to_datetime(all_data_df["timestamp"]).min().strftime("%Y-%m-%d")
+        max_date = pd.to_datetime(all_data_df["timestamp"]).max().strftime("%Y-%m-%d")
+        date_range = processor.create_future_dates_df(min_date, max_date)
+        bench(
+            "create_future_dates_df",
+            lambda: processor.create_future_dates_df(min_date, max_date),
+        )
+        bench(
+            "merge_dataframes",
+            lambda: processor.merge_dataframes(date_range, all_data_df),
+        )
+        merged_df = processor.merge_dataframes(date_range, all_data_df)
+        bench("create_daily_table", lambda: processor.create_daily_table(all_data_df))
+        daily_df = processor.create_daily_table(all_data_df)
+
+        recent_df = merged_df[
+            merged_df["timestamp"]
+            >= merged_df["timestamp"].max() - pd.Timedelta(days=30)
+        ]
+        bench("get_monthly_data", lambda: processor.get_monthly_data(merged_df))
+        bench("get_annual_data", lambda: processor.get_annual_data(merged_df))
+        bench("get_daily_data", lambda: processor.get_daily_data(merged_df.copy()))
+        bench("get_weekly_totals", lambda: processor.get_weekly_totals(merged_df))
+        bench("PrefixSums.update", lambda: PrefixSums().update(daily_df))
+        sums = PrefixSums()
+        sums.update(daily_df)
+        bench("get_monthly_data.prefix", lambda: processor.get_monthly_data(sums))
+        bench("get_annual_data.prefix", lambda: processor.get_annual_data(sums))
+        bench("get_weekly_totals.prefix", lambda: processor.get_weekly_totals(sums))
+        bench("PrefixSums.total", lambda: sums.total(min_date, max_date))
+        bench(
+            "get_latest_ride_metrics",
+            lambda: processor.get_latest_ride_metrics(merged_df),
+        )
+        bench(
+            "get_current_month_weekly_summary",
+            lambda: processor.get_current_month_weekly_summary(sums),
+        )
+        bench("weekly_summary_rides", lambda: processor.weekly_summary_rides(recent_df))
+        bench("last14rides", lambda: processor.last14rides(recent_df))
+
+        # Figures
+        monthly = processor.get_monthly_data(merged_df)
+        monthly_tss = monthly.merge(
+            merged_df.groupby("yrmo")["training_stress_score"].sum().reset_index(),
+            on="yrmo",
+            how="left",
+        )
+        annual = processor.get_annual_data(merged_df)
+        daily = processor.get_daily_data(merged_df.copy())
+        weekly = processor.get_weekly_totals(merged_df)
+        recent = processor.weekly_summary_rides(recent_df)
+        fitness = daily_df.assign(CTL=0.0, ATL=0.0, TSB=0.0)
+        # Best-effort curve shape for a 5 hour ride: 1200 W sprint decaying
+        # towards 200 W
+        power_curve = (200 + 1000 / np.sqrt(np.arange(1, 5 * 3600 + 1))).astype(
+            "float32"
+        )
+        bench(
+            "create_monthly_distance_plot",
+            lambda: visualizer.create_monthly_distance_plot(monthly),
+        )
+        bench(
+            "create_annual_distance_plot",
+            lambda: visualizer.create_annual_distance_plot(annual),
+        )
+        bench(
+            "create_daily_distance_plot",
+            lambda: visualizer.create_daily_distance_plot(daily),
+        )
+        bench(
+            "create_weekly_totals_plot",
+            lambda: visualizer.create_weekly_totals_plot(weekly),
+        )
+        bench(
+            "create_monthly_tss_plot",
+            lambda: visualizer.create_monthly_tss_plot(monthly_tss),
+        )
+        bench(
+            "create_recent_rides_visualizations",
+            lambda: visualizer.create_recent_rides_visualizations(recent),
+        )
+        bench(
+            "create_ctl_graph",
+            lambda: visualizer.create_ctl_graph(fitness, min_date, max_date),
+        )
+        bench(
+            "create_power_curve_plot",
+            lambda: visualizer.create_power_curve_plot(
+                {"Range": power_curve, "All Time": power_curve}
+            ),
+        )
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    # A benchmark regresses when it is slower or uses more memory than the
+    # baseline by more than ``tolerance``; tiny absolute values are noise
+    regressions = []
+    for scale, benches in results.items():
+        for name, current in benches.items():
+            previous = baseline.get(scale, {}).get(name)
+            if previous is None:
+                continue
+            for metric, floor in (("seconds", 0.005), ("peak_mb", 1.0)):
+                if current[metric] < floor:
+                    continue
+                if current[metric] > previous[metric] * (1 + tolerance):
+                    regressions.append(
+                        f"{scale} {name}: {metric} {previous[metric]} -> {current[metric]}"
+                    )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sessions", type=int, nargs="+", default=[1000, 10000, 100000]
+    )
+    parser.add_argument(
+        "--years", type=float, default=10, help="date span of the history"
+    )
+    parser.add_argument(
+        "--fit-files", type=int, default=50, help="FIT files to ingest (0 to skip)"
+    )
+    parser.add_argument(
+        "--fit-seconds", type=int, default=1800, help="records per FIT file"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--output", help="also write this run's results here")
+    args = parser.parse_args()
+
+    results = {str(n): run_scale(n, args) for n in args.sessions}
+    failures = [
+        f
+        for n in args.sessions
+        for check in (check_normalize_sessions, check_weekly_totals)
+        for f in check(n, args)
+    ] + check_torn_log(args)
+    for line in failures:
+        print(f"MISMATCH {line}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 1 if failures else 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against; run with --save-baseline first")
+        return 1 if failures else 0
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print("No regressions against the baseline")
+    return 1 if regressions or failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
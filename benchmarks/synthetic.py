@@ -0,0 +1,243 @@
+import datetime as dt
+import os
+import random
+import struct
+from typing import List, Optional
+
+from garmin_fit_sdk.crc_calculator import CrcCalculator
+
+# Seconds between the Unix epoch and the FIT epoch (1989-12-31 00:00 UTC)
+FIT_EPOCH = 631065600
+
+# FIT base type -> (base type byte, struct format)
+BASE_TYPES = {
+    "enum": (0x00, "B"),
+    "sint8": (0x01, "b"),
+    "uint8": (0x02, "B"),
+    "uint16": (0x84, "H"),
+    "sint32": (0x85, "i"),
+    "uint32": (0x86, "I"),
+    "uint32z": (0x8C, "I"),
+    "float32": (0x88, "f"),
+}
+
+# (field number, base type) for the three messages written
+FILE_ID_FIELDS = [
+    (0, "enum"),
+    (1, "uint16"),
+    (2, "uint16"),
+    (3, "uint32z"),
+    (4, "uint32"),
+]
+RECORD_FIELDS = [
+    (253, "uint32"),  # timestamp
+    (0, "sint32"),  # position_lat
+    (1, "sint32"),  # position_long
+    (2, "uint16"),  # altitude
+    (3, "uint8"),  # heart_rate
+    (4, "uint8"),  # cadence
+    (6, "uint16"),  # speed
+    (7, "uint16"),  # power
+]
+SESSION_FIELDS = [
+    (253, "uint32"),  # timestamp
+    (2, "uint32"),  # start_time
+    (5, "enum"),  # sport
+    (6, "enum"),  # sub_sport
+    (7, "uint32"),  # total_elapsed_time
+    (8, "uint32"),  # total_timer_time
+    (9, "uint32"),  # total_distance
+    (14, "uint16"),  # avg_speed
+    (16, "uint8"),  # avg_heart_rate
+    (18, "uint8"),  # avg_cadence
+    (20, "uint16"),  # avg_power
+    (21, "uint16"),  # max_power
+    (22, "uint16"),  # total_ascent
+    (23, "uint16"),  # total_descent
+    (34, "uint16"),  # normalized_power
+    (35, "uint16"),  # training_stress_score
+    (36, "uint16"),  # intensity_factor
+    (37, "uint16"),  # left_right_balance
+    (48, "uint32"),  # total_work
+    (57, "sint8"),  # avg_temperature
+    (181, "float32"),  # total_grit
+    (187, "float32"),  # avg_flow
+]
+
+SUB_SPORTS = ["road", "indoor_cycling", "gravel_cycling", "mountain"]
+SUB_SPORT_CODES = {"road": 7, "indoor_cycling": 6, "gravel_cycling": 46, "mountain": 8}
+FTP = 250
+
+
+def ride_start_times(
+    n: int, start: dt.datetime, end: dt.datetime, rng: random.Random
+) -> List[dt.datetime]:
+    # n ride starts spread over [start, end), mostly mornings and evenings,
+    # so busy spans get several rides on some days
+    span_days = max(1, (end - start).days)
+    starts = []
+    for _ in range(n):
+        day = start + dt.timedelta(days=rng.randrange(span_days))
+        hour = rng.choice([6, 7, 8, 12, 16, 17, 18])
+        starts.append(day.replace(hour=hour, minute=rng.randrange(60), second=0))
+    return sorted(starts)
+
+
+def session_values(start: dt.datetime, rng: random.Random) -> dict:
+    # One ride's summary in the units the FIT decoder reports
+    timer_time = max(900.0, round(rng.lognormvariate(8.5, 0.5)))
+    elapsed_time = round(timer_time * rng.uniform(1.0, 1.15))
+    speed = rng.uniform(6.0, 10.0)
+    avg_power = int(rng.gauss(190, 30))
+    normalized_power = avg_power + rng.randint(5, 30)
+    intensity_factor = round(normalized_power / FTP, 3)
+    right = rng.randint(46, 54)
+    return {
+        "timestamp": start + dt.timedelta(seconds=elapsed_time),
+        "start_time": start,
+        "sport": "cycling",
+        "sub_sport": rng.choice(SUB_SPORTS),
+        "total_elapsed_time": float(elapsed_time),
+        "total_timer_time": float(timer_time),
+        "total_distance": round(timer_time * speed, 2),
+        "avg_speed": round(speed, 3),
+        "avg_heart_rate": rng.randint(120, 160),
+        "avg_cadence": rng.randint(75, 95),
+        "avg_power": avg_power,
+        "max_power": avg_power + rng.randint(200, 700),
+        "total_ascent": rng.randint(0, 2000),
+        "total_descent": rng.randint(0, 2000),
+        "normalized_power": normalized_power,
+        "training_stress_score": round(
+            timer_time * normalized_power * intensity_factor / (FTP * 36), 1
+        ),
+        "intensity_factor": intensity_factor,
+        # Right-side percentage flagged with the "right" bit, as devices send it
+        "left_right_balance": 0x8000 | right,
+        "total_work": int(avg_power * timer_time),
+        "avg_temperature": rng.randint(-5, 35),
+        "total_grit": round(rng.uniform(0, 20), 1),
+        "avg_flow": round(rng.uniform(0, 10), 1),
+        "enhanced_avg_speed": round(speed, 3),
+    }
+
+
+def generate_sessions(
+    n: int,
+    start: dt.datetime,
+    end: dt.datetime,
+    seed: int = 0,
+) -> List[dict]:
+    # Raw session dicts shaped like decode_fit_file output (UTC datetimes,
+    # metric units), ready for normalize_sessions
+    rng = random.Random(seed)
+    return [session_values(t, rng) for t in ride_start_times(n, start, end, rng)]
+
+
+def definition(local: int, global_num: int, fields: list) -> bytes:
+    out = struct.pack("<BBBHB", 0x40 | local, 0, 0, global_num, len(fields))
+    for num, base_type in fields:
+        fmt = BASE_TYPES[base_type][1]
+        out += struct.pack("<BBB", num, struct.calcsize(fmt), BASE_TYPES[base_type][0])
+    return out
+
+
+def data_message(local: int, fields: list, values: list) -> bytes:
+    fmt = "<B" + "".join(BASE_TYPES[t][1] for _, t in fields)
+    return struct.pack(fmt, local, *values)
+
+
+def fit_timestamp(t: dt.datetime) -> int:
+    return int(t.timestamp()) - FIT_EPOCH
+
+
+def write_fit_file(
+    path: str, start: dt.datetime, seconds: int, rng: random.Random
+) -> None:
+    # A minimal activity file: file_id, one record per second, one session
+    t0 = fit_timestamp(start)
+    body = definition(0, 0, FILE_ID_FIELDS)
+    body += data_message(0, FILE_ID_FIELDS, [4, 1, 3121, rng.randint(1, 2**31), t0])
+
+    body += definition(1, 20, RECORD_FIELDS)
+    powers = []
+    lat = int(40.0 * 2**31 / 180)
+    long = int(-105.0 * 2**31 / 180)
+    for i in range(seconds):
+        power = max(0, int(rng.gauss(200, 60)))
+        powers.append(power)
+        body += data_message(
+            1,
+            RECORD_FIELDS,
+            [
+                t0 + i,
+                lat + i * 100,
+                long,
+                int((1600 + i * 0.01 + 500) * 5),
+                rng.randint(110, 170),
+                rng.randint(70, 100),
+                int(8.5 * 1000),
+                power,
+            ],
+        )
+
+    summary = session_values(start, rng)
+    avg_power = int(sum(powers) / len(powers))
+    session = [
+        t0 + seconds,
+        t0,
+        2,
+        SUB_SPORT_CODES[summary["sub_sport"]],
+        seconds * 1000,
+        int(seconds * 0.95) * 1000,
+        int(seconds * 8.5 * 100),
+        8500,
+        summary["avg_heart_rate"],
+        summary["avg_cadence"],
+        avg_power,
+        max(powers),
+        summary["total_ascent"],
+        summary["total_descent"],
+        avg_power + 10,
+        int(summary["training_stress_score"] * 10),
+        int(summary["intensity_factor"] * 1000),
+        summary["left_right_balance"],
+        sum(powers),
+        summary["avg_temperature"],
+        summary["total_grit"],
+        summary["avg_flow"],
+    ]
+    body += definition(2, 18, SESSION_FIELDS)
+    body += data_message(2, SESSION_FIELDS, session)
+
+    header = struct.pack("<BBHI4s", 14, 0x20, 2132, len(body), b".FIT")
+    header += struct.pack("<H", CrcCalculator.calculate_crc(header, 0, len(header)))
+    content = header + body
+    content += struct.pack("<H", CrcCalculator.calculate_crc(content, 0, len(content)))
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def generate_fit_files(
+    out_dir: str,
+    n: int,
+    start: dt.datetime,
+    end: dt.datetime,
+    seconds: int = 1800,
+    seed: int = 0,
+) -> List[str]:
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for i, t in enumerate(ride_start_times(n, start, end, rng)):
+        path = os.path.join(out_dir, f"synthetic_{i:06d}.fit")
+        write_fit_file(path, t, seconds, rng)
+        paths.append(path)
+    return paths
+
+
+def default_span(years: float, end: Optional[dt.datetime] = None) -> tuple:
+    end = end or dt.datetime.now(dt.timezone.utc).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    return end - dt.timedelta(days=int(365.25 * years)), end
@@ -1,11 +1,20 @@
 from typing import Any, Dict, Tuple
 
+import numpy as np
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objs as go
 from plotly.subplots import make_subplots
 
+from backend.StageTimer import stage_timer
+from frontend.downsample import (
+    DEFAULT_MAX_POINTS,
+    log_indices,
+    lttb_indices,
+    minmax_indices,
+)
 
+
+@stage_timer.timed_methods
 class CyclingDataVisualizer:
     def __init__(self):
         pass
@@ -30,7 +39,7 @@ class CyclingDataVisualizer:
                 x=monthly_data["yrmo"].astype(str),
                 y=monthly_data.total_timer_time,
                 name="Riding Time",
-                mode="lines+markers",
+                mode="lines",
             ),
             secondary_y=True,
         )
@@ -48,16 +57,45 @@ class CyclingDataVisualizer:
         return fig
 
     def create_ctl_graph(
-        self, merged_df: pd.DataFrame, start_dt: str, end_dt: str
+        self,
+        merged_df: pd.DataFrame,
+        start_dt: str,
+        end_dt: str,
+        max_points: int = DEFAULT_MAX_POINTS,
     ) -> go.Figure:
         filtered_df = merged_df[
             (pd.to_datetime(merged_df["timestamp"]) >= start_dt)
             & (pd.to_datetime(merged_df["timestamp"]) <= end_dt)
         ]
+        x = pd.to_datetime(filtered_df["timestamp"]).to_numpy("datetime64[s]")
 
-        fig = px.line(
-            filtered_df, x="timestamp", y="CTL", width=1400, height=800, markers=True
+        fig = go.Figure()
+        for col, name in [
+            ("CTL", "Fitness (CTL)"),
+            ("ATL", "Fatigue (ATL)"),
+            ("TSB", "Form (TSB)"),
+        ]:
+            # Long ranges are thinned to about one point per pixel; zooming in
+            # re-renders the visible window at full resolution
+            keep = lttb_indices(
+                x.astype("int64"), filtered_df[col].to_numpy(), max_points
+            )
+            fig.add_trace(
+                go.Scattergl(
+                    x=filtered_df["timestamp"].iloc[keep],
+                    y=filtered_df[col].iloc[keep].round(1),
+                    name=name,
+                    mode="lines",
+                )
+            )
+        fig.update_layout(
+            width=1400,
+            height=800,
+            legend=dict(
+                orientation="h", yanchor="auto", y=0.99, xanchor="auto", x=0.01
+            ),
         )
+        fig.update_yaxes(title_text="Training Load")
 
         return fig
 
@@ -80,7 +118,7 @@ class CyclingDataVisualizer:
                 x=annual_data["yr"].astype(str),
                 y=annual_data.total_timer_time,
                 name="Riding Time",
-                mode="lines+markers",
+                mode="lines",
             ),
             secondary_y=True,
         )
@@ -110,11 +148,13 @@ class CyclingDataVisualizer:
 
         return fig_tbl
 
-    def create_daily_distance_plot(self, daily_data: pd.DataFrame) -> go.Figure:
-        max_days = 1000
-        if len(daily_data) > max_days:
-            print(f"Daily data has {len(daily_data)} days, limiting to last {max_days}")
-            daily_data = daily_data.tail(max_days)
+    def create_daily_distance_plot(
+        self, daily_data: pd.DataFrame, max_points: int = DEFAULT_MAX_POINTS
+    ) -> go.Figure:
+        # Keep each bucket's shortest and longest day rather than dropping
+        # the older history, so big days survive at any range
+        keep = minmax_indices(daily_data["Distance_miles"].to_numpy(), max_points)
+        daily_data = daily_data.iloc[keep]
 
         fig = make_subplots(specs=[[{"secondary_y": True}]])
 
@@ -134,7 +174,7 @@ class CyclingDataVisualizer:
                 x=daily_data["date"].astype(str),
                 y=daily_data.total_timer_time,
                 name="Riding Time",
-                mode="lines+markers",
+                mode="lines",
             ),
             secondary_y=True,
         )
@@ -265,3 +305,55 @@ class CyclingDataVisualizer:
         fig.update_yaxes(tickformat=",")
 
         return fig
+
+    def create_power_curve_plot(
+        self, curves: Dict[str, Any], max_points: int = DEFAULT_MAX_POINTS
+    ) -> go.Figure:
+        """Mean-maximal power curves, one line per label, on a log duration axis"""
+        fig = go.Figure()
+
+        for label, curve in curves.items():
+            if not len(curve):
+                continue
+            keep = log_indices(len(curve), max_points)
+            fig.add_trace(
+                go.Scatter(
+                    x=keep + 1,
+                    y=np.asarray(curve)[keep],
+                    name=label,
+                    mode="lines",
+                    hovertemplate="%{x}s: %{y:.0f} W",
+                )
+            )
+
+        tick_seconds = [1, 5, 15, 30, 60, 300, 600, 1200, 3600, 7200, 18000]
+        tick_labels = [
+            "1s",
+            "5s",
+            "15s",
+            "30s",
+            "1m",
+            "5m",
+            "10m",
+            "20m",
+            "1h",
+            "2h",
+            "5h",
+        ]
+        fig.update_layout(
+            title="Power Curve",
+            title_x=0.5,
+            height=700,
+            legend=dict(
+                orientation="h", yanchor="auto", y=0.99, xanchor="auto", x=0.01
+            ),
+        )
+        fig.update_xaxes(
+            title_text="Duration",
+            type="log",
+            tickvals=tick_seconds,
+            ticktext=tick_labels,
+        )
+        fig.update_yaxes(title_text="Average Power (W)")
+
+        return fig
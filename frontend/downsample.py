@@ -0,0 +1,58 @@
+import numpy as np
+
+# Roughly one point per horizontal pixel of the app's wide figures
+DEFAULT_MAX_POINTS = 1400
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    # Largest-Triangle-Three-Buckets: keeps the first and last point and, from
+    # each bucket in between, the point forming the largest triangle with the
+    # previous pick and the next bucket's mean. Preserves the visual shape of
+    # a line far better than taking every k-th point.
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype="float64")
+    y = np.nan_to_num(np.asarray(y, dtype="float64"))
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype("int64")
+    picked = np.empty(n_out, dtype="int64")
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(area.argmax())
+        picked[i + 1] = a
+    return picked
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    # Min and max of each of n_out / 2 equal buckets, in order; keeps every
+    # spike, which is what matters for bars like daily distance
+    n = len(y)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+    y = np.nan_to_num(np.asarray(y, dtype="float64"))
+    size = -(-n // (n_out // 2))
+    buckets = -(-n // size)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    rows = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    lows = offsets + np.nanargmin(rows, axis=1)
+    highs = offsets + np.nanargmax(rows, axis=1)
+    return np.unique(np.concatenate([lows, highs]))
+
+
+def log_indices(n: int, n_out: int) -> np.ndarray:
+    # Evenly spaced on a log axis (power curve durations): every early
+    # second is kept, long durations are thinned out
+    if n_out >= n:
+        return np.arange(n)
+    return np.unique(np.geomspace(1, n, n_out).astype("int64") - 1)
@@ -10,13 +10,39 @@ class create_app_layout:
     def __init__(self):
         pass
 
-    def create_layout(self):
+    def create_layout(self, data_version: str = None, athletes: list = None):
+        athletes = athletes or []
         layout = html.Div(
             [
                 html.H1(
                     "Cycling Dashboard",
                     style={"textAlign": "center", "marginBottom": 10},
                 ),
+                # Whose rides are shown; hidden when there is only one rider
+                html.Div(
+                    dcc.Dropdown(
+                        id="athlete",
+                        options=athletes,
+                        value=athletes[0]["value"] if athletes else None,
+                        clearable=False,
+                    ),
+                    style={
+                        "width": 300,
+                        "margin": "0 auto 10px",
+                        "display": "block" if len(athletes) > 1 else "none",
+                    },
+                ),
+                # Version of the loaded ride data; outputs built from it are
+                # only rebuilt when this changes
+                dcc.Store(id="data-version", data=data_version),
+                # Daily series the date-range tabs filter in the browser
+                dcc.Store(id="client-series"),
+                # Checks for newly ingested rides
+                dcc.Interval(id="data-version-poll", interval=3 * 1000),
+                html.Div(
+                    id="ingest-status",
+                    style={"textAlign": "center", "color": "gray"},
+                ),
                 dcc.Tabs(
                     id="tabs",
                     value="recent-rides",
@@ -83,7 +109,7 @@ class create_app_layout:
                                             "Annual Distance and Time",
                                             style={"textAlign": "center"},
                                         ),
-                                        html.Div(id="annual-distance-plot"),
+                                        dcc.Graph(id="annual-distance-plot"),
                                         html.H2(
                                             "Monthly Distance and Time",
                                             style={
@@ -91,7 +117,7 @@ class create_app_layout:
                                                 "marginTop": 20,
                                             },
                                         ),
-                                        html.Div(id="monthly-distance-plot"),
+                                        dcc.Graph(id="monthly-distance-plot"),
                                         html.H2(
                                             "Weekly Distance and Time",
                                             style={
@@ -99,7 +125,7 @@ class create_app_layout:
                                                 "marginTop": 20,
                                             },
                                         ),
-                                        html.Div(id="weekly-totals-plot"),
+                                        dcc.Graph(id="weekly-totals-plot"),
                                         html.Div(
                                             [
                                                 html.Label("Date Range:"),
@@ -147,7 +173,7 @@ class create_app_layout:
                                             ],
                                             style={"margin": "20px 0"},
                                         ),
-                                        html.Div(id="ctl-graph"),
+                                        dcc.Graph(id="ctl-graph"),
                                         html.H2(
                                             "Monthly Training Stress Score",
                                             style={
@@ -155,7 +181,38 @@ class create_app_layout:
                                                 "marginTop": 30,
                                             },
                                         ),
-                                        html.Div(id="monthly-tss-graph"),
+                                        dcc.Graph(id="monthly-tss-graph"),
+                                    ]
+                                )
+                            ],
+                        ),
+                        # Power Curve Tab
+                        dcc.Tab(
+                            label="Power Curve",
+                            value="power-curve",
+                            children=[
+                                html.Div(
+                                    [
+                                        html.H2(
+                                            "Mean-Maximal Power",
+                                            style={"textAlign": "center"},
+                                        ),
+                                        html.Div(
+                                            [
+                                                html.Label("Date Range:"),
+                                                dcc.DatePickerRange(
+                                                    id="power-curve-date-range",
+                                                    start_date=(
+                                                        datetime.now()
+                                                        - timedelta(days=90)
+                                                    ).date(),
+                                                    end_date=datetime.now().date(),
+                                                    display_format="YYYY-MM-DD",
+                                                ),
+                                            ],
+                                            style={"margin": "20px 0"},
+                                        ),
+                                        html.Div(id="power-curve-graph"),
                                     ]
                                 )
                             ],
@@ -1,6 +1,13 @@
+import time
+
+# Taken before anything else is imported so the first-paint time printed at
+# startup includes import cost
+launch_time = time.perf_counter()
+
+import atexit
 import os
 import webbrowser
-from datetime import datetime, timedelta
+from datetime import date, datetime
 from threading import Timer
 
 import dash
@@ -8,12 +15,25 @@ import pandas as pd
 import plotly.graph_objs as go
 from colorama import Style
 from dash import dcc, html
-from dash.dependencies import Input, Output
-
-from backend.CyclingDataProcessor import CyclingDataProcessor
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from flask import abort, jsonify, request
+
+from backend.AggregateApi import AggregateApi
+from backend.AggregateCache import AggregateCache
+from backend.AthleteRegistry import AthleteRegistry
+from backend.CyclingDataProcessor import decode_pool
+from backend.FolderWatcher import FolderWatcher
+from backend.IngestQueue import IngestQueue
+from backend.PrefixSums import PrefixSums
+from backend.SnapshotStore import snapshot_mode
+from backend.StageTimer import TIMING_ENV, stage_timer
 from frontend.CyclingDataVisualizer import CyclingDataVisualizer
 from frontend.layout import create_app_layout
 
+# With the reloader on, the launching process only watches the source and
+# restarts a child that does the serving
+DEBUG = True
+
 
 def open_browser():
     webbrowser.open("http://127.0.0.1:8050/")
@@ -22,90 +42,148 @@ def open_browser():
 # Initialize the Dash app
 app = dash.Dash(__name__, suppress_callback_exceptions=True)
 
-# Initialize data processor and visualizer
-data_processor = CyclingDataProcessor()
+# Athletes served by this process (see AthleteRegistry for the config file)
+registry = AthleteRegistry()
 visualizer = CyclingDataVisualizer()
 
-# Process any new files before starting the app
-print("Processing new files...")
-data_processor.unzipfiles()
-new_data = data_processor.process_new_files()
-existing_data = data_processor.read_existing_files()
-if new_data:
-    updated_data = data_processor.create_new_file(new_data, existing_data)
-    data_processor.write_out_file(updated_data)
-    print(f"Processed {len(new_data)} new files")
-else:
-    print("No new files to process, using latest data file")
-
-# Create the base dataframe with all data
-if new_data:
-    all_data_df = data_processor.create_dataframe(updated_data)
-
-else:
-    all_data_df = data_processor.create_dataframe(existing_data)
-
-# Get date ranges from the data
-if not all_data_df.empty:
-    timestamps = pd.to_datetime(all_data_df["timestamp"])
-    min_date = timestamps.min().strftime("%Y-%m-%d")
-    max_date = timestamps.max().strftime("%Y-%m-%d")
-else:
-    min_date = str(
-        datetime.now().date() - timedelta(days=365 * 5)
-    )  # 5 years back as fallback
-    max_date = str(datetime.now().date())
-
-print(f"Data range: {min_date} to {max_date}")
-
-# Create date ranges
-current_month_start = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
-current_month_end = str(datetime.now().date())
-recent_date_range = data_processor.create_future_dates_df(
-    current_month_start, current_month_end
-)
-full_date_range = data_processor.create_future_dates_df(min_date, max_date)
 
-# Create merged dataframes for different views
-recent_merged_df = data_processor.merge_dataframes(recent_date_range, all_data_df)
-full_merged_df = data_processor.merge_dataframes(full_date_range, all_data_df)
+def ingest_athlete(athlete_id: str) -> None:
+    # Ingest queue worker; once an athlete's first pass is done its download
+    # folder is watched and changes queue another pass
+    athlete = registry.get(athlete_id)
+    version = athlete.processor.store.version()
+    ingested = athlete.ingest()
+    if ingested and athlete.processor.store.version() != version:
+        # Cached entries are keyed by data version, so the old ones can no
+        # longer match; free them now rather than waiting for the LRU
+        for cache in (client_series_cache, recent_rides_cache, aggregate_api.cache):
+            cache.clear()
+    if (
+        ingested
+        and snapshot_mode() == "publish"
+        and athlete.snapshots.current_version() != athlete.processor.store.version()
+    ):
+        # Loaded athletes publish as their views are rebuilt; others (the
+        # first pass, or evicted since) are loaded through the registry so
+        # the memory budget still applies
+        registry.views(athlete_id)
+    if ingested and athlete_id not in folder_watchers:
+        folder_watchers[athlete_id] = FolderWatcher(
+            athlete.processor.download_path,
+            lambda: ingest_queue.submit(athlete_id),
+        )
+        folder_watchers[athlete_id].start()
+
+
+ingest_queue = IngestQueue(ingest_athlete)
+folder_watchers = {}
+
+
+def start_app() -> None:
+    # Load the first athlete from what is already stored and queue every
+    # athlete's ingest, so the server binds straight away. Other athletes
+    # load when they are first selected.
+    if snapshot_mode() == "read":
+        # Serving worker: the ingest process does all of this and publishes
+        # snapshots that athletes map on first use
+        return
+    athlete = registry.get(registry.default_id)
+    # Fork the decode workers before any thread is started (see decode_pool)
+    decode_pool(athlete.processor.decode_workers)
+    views = registry.views(athlete.id)
+    if views["all_data_df"].empty:
+        # First launch: there is nothing stored to show yet, so ingest before
+        # serving
+        ingest_athlete(athlete.id)
+    else:
+        print(
+            f"Serving {len(views['all_data_df'])} stored sessions "
+            f"({athlete.memory_bytes() / 2**20:.1f} MB in memory) "
+            f"{time.perf_counter() - launch_time:.2f}s after launch"
+        )
+        ingest_queue.submit(athlete.id)
+    for athlete_id in registry.athletes:
+        if athlete_id != athlete.id:
+            ingest_queue.submit(athlete_id)
+    ingest_queue.start()
+
+
+# Daily series and figure templates for the clientside tabs, one per athlete
+# and data version
+client_series_cache = AggregateCache(maxsize=8)
+
+# Recent Rides outputs, built once per athlete and data version
+recent_rides_cache = AggregateCache(maxsize=8)
+
+# Aggregations as JSON or Arrow for other local tools, registered below
+aggregate_api = AggregateApi(registry)
+
+# The reloader's launching process never serves, so it skips all data work
+if not (__name__ == "__main__" and DEBUG and not os.environ.get("WERKZEUG_RUN_MAIN")):
+    start_app()
+
+
+# Stage timings (set CYCLING_DASH_TIMING=1 to collect them), loaded athletes
+# and cache hit rates
+@app.server.route("/_stats")
+def stage_stats():
+    if request.remote_addr not in ("127.0.0.1", "::1"):
+        abort(403)
+    return jsonify(
+        {
+            "enabled": stage_timer.enabled,
+            "stages": stage_timer.stats(),
+            "athletes": registry.stats(),
+            "ingest_pending": ingest_queue.pending(),
+            "caches": {
+                "client_series": client_series_cache.stats(),
+                "recent_rides": recent_rides_cache.stats(),
+                "aggregates_api": aggregate_api.cache.stats(),
+            },
+        }
+    )
 
-# Create the specific dataframes for visualizations
-recent_rides = data_processor.weekly_summary_rides(recent_merged_df)
-last14rides = data_processor.last14rides(recent_merged_df)
-latest_ride_metrics = data_processor.get_latest_ride_metrics(full_merged_df)
 
-# Get current month weekly summaries
-current_month_weekly_summary = data_processor.get_current_month_weekly_summary(
-    recent_merged_df
-)
+# /api/aggregates/<granularity> (see AggregateApi)
+aggregate_api.register(app.server)
 
-# Set the app layout using the layout class
-layout_creator = create_app_layout()
-app.layout = layout_creator.create_layout()
 
+# Optionally write the timings out when the app exits
+if stage_timer.enabled and os.environ.get(TIMING_ENV + "_DUMP"):
+    atexit.register(stage_timer.dump, os.environ[TIMING_ENV + "_DUMP"])
 
-# Callback for Recent Rides tab
-@app.callback(
-    [
-        Output("monthly-totals", "children"),
-        Output("lastride", "children"),
-        Output("weekly-summary", "children"),
-        Output("last-14-rides", "children"),
-    ],
-    Input("tabs", "value"),
+
+def version_key(athlete, views: dict) -> str:
+    # What open pages hold in the data-version store; switching athletes
+    # changes it just like new rides do. Taken from the views themselves, so
+    # a key never names frames newer or older than the ones it is cached with
+    return f"{athlete.id}:{views['data_version']}"
+
+
+# Set the app layout using the layout class; served per page load so a new
+# tab starts at the current data version
+layout_creator = create_app_layout()
+app.layout = lambda: layout_creator.create_layout(
+    version_key(registry.get(registry.default_id), registry.views(registry.default_id)),
+    registry.options(),
 )
-def update_recent_rides(tab):
-    print(
-        f"Recent rides data shape: {recent_rides.shape if hasattr(recent_rides, 'shape') else 'No shape'}"
-    )
+
+
+def build_recent_rides_outputs(athlete, views: dict, today: date):
+    recent_rides = views["recent_rides"]
+    latest_ride_metrics = views["latest_ride_metrics"]
 
     # Create visualizations using pre-processed data
     weeklysummary = visualizer.create_recent_rides_visualizations(recent_rides)
-    last14rides_vis = visualizer.create_recent_rides_visualizations(last14rides)
+    last14rides_vis = visualizer.create_recent_rides_visualizations(
+        views["last14rides"]
+    )
 
-    # Get the month name
-    current_month_name = datetime.now().strftime("%B %Y")
+    # Get the month name and the totals of the weeks it overlaps
+    current_month_weekly_summary = athlete.processor.get_current_month_weekly_summary(
+        PrefixSums(views["daily_cumsum"]), today
+    )
+    current_month_name = today.strftime("%B %Y")
 
     # Create monthly totals summary
     monthly_totals = html.Div(
@@ -138,143 +216,201 @@ def update_recent_rides(tab):
         ]
     )
 
-    return (
+    return [
         monthly_totals,
         dcc.Graph(figure=lastride_fig),
         dcc.Graph(figure=weeklysummary),
         dcc.Graph(figure=last14rides_vis),
-    )
+    ]
+
+
+def build_client_series(athlete, views: dict) -> dict:
+    # The daily table and fitness series as compact columns (dates follow
+    # from the start date since both are contiguous), plus empty figures
+    # whose styling the clientside callbacks fill with the selected range
+    data_processor = athlete.processor
+    daily_df = views["daily_df"]
+    series = views["fitness"]
+    empty = daily_df.iloc[:0]
+    monthly = data_processor.get_monthly_data(empty)
+    figures = {
+        "annual": visualizer.create_annual_distance_plot(
+            data_processor.get_annual_data(empty)
+        ),
+        "monthly": visualizer.create_monthly_distance_plot(monthly),
+        "weekly": visualizer.create_weekly_totals_plot(
+            data_processor.get_weekly_totals(empty)
+        ),
+        "ctl": visualizer.create_ctl_graph(
+            pd.DataFrame(columns=["timestamp", "CTL", "ATL", "TSB"]), "", ""
+        ),
+        "tss": visualizer.create_monthly_tss_plot(
+            monthly.assign(training_stress_score=0.0)
+        ),
+    }
+    return {
+        "daily": {
+            "start": daily_df.index[0].strftime("%Y-%m-%d"),
+            "distance": daily_df["Distance_miles"].round(4).tolist(),
+            "seconds": daily_df["total_timer_time"].round().astype(int).tolist(),
+            "tss": daily_df["training_stress_score"].round(1).tolist(),
+            "rides": daily_df["rides"].tolist(),
+        },
+        "fitness": {
+            "start": series.index[0].strftime("%Y-%m-%d") if len(series) else None,
+            **{col: series[col].round(1).tolist() for col in ("CTL", "ATL", "TSB")},
+        },
+        # The plotly theme is the same for every figure, so it is sent once
+        "theme": figures["ctl"].layout.template.to_plotly_json(),
+        "figures": {
+            name: fig.update_layout(template=None).to_plotly_json()
+            for name, fig in figures.items()
+        },
+    }
+
+
+# Tells open pages about newly ingested rides; returns no update (and so
+# repaints nothing) while the version is unchanged
+@app.callback(
+    Output("data-version", "data"),
+    Input("data-version-poll", "n_intervals"),
+    Input("athlete", "value"),
+    State("data-version", "data"),
+)
+@stage_timer.timed("callback.poll_data_version")
+def poll_data_version(n_intervals, athlete_id, version):
+    athlete = registry.get(athlete_id)
+    current = version_key(athlete, registry.views(athlete.id))
+    if version == current:
+        return dash.no_update
+    return current
+
+
+# Startup ingest progress in the header; cleared once it has finished
+@app.callback(
+    Output("ingest-status", "children"),
+    Input("data-version-poll", "n_intervals"),
+    Input("athlete", "value"),
+    State("ingest-status", "children"),
+)
+@stage_timer.timed("callback.update_ingest_status")
+def update_ingest_status(n_intervals, athlete_id, current):
+    athlete = registry.get(athlete_id)
+    if athlete.snapshot_mode == "read":
+        # Workers learn of the ingest process's progress by checking for a
+        # new snapshot
+        registry.views(athlete.id)
+    status = athlete.status
+    text = "" if status["state"] == "ready" else status["message"]
+    if text == (current or ""):
+        return dash.no_update
+    return text
 
 
-# Callback for Distance and Time tab
+# Callback for Recent Rides tab
+@app.callback(
+    [
+        Output("monthly-totals", "children"),
+        Output("lastride", "children"),
+        Output("weekly-summary", "children"),
+        Output("last-14-rides", "children"),
+    ],
+    Input("data-version", "data"),
+    State("athlete", "value"),
+)
+@stage_timer.timed("callback.update_recent_rides")
+def update_recent_rides(version, athlete_id):
+    # Fires on page load and when the data version changes, not on tab
+    # switches; the rendered components are reused until new rides arrive or
+    # the date changes (the month header is for today's month)
+    athlete = registry.get(athlete_id)
+    views = registry.views(athlete.id)
+    if "daily_df" not in views:
+        return [html.P("No rides stored yet", style={"textAlign": "center"})] + [
+            None
+        ] * 3
+    today = datetime.now().date()
+    key = (version_key(athlete, views), today)
+    outputs = recent_rides_cache.get(key)
+    if outputs is None:
+        outputs = build_recent_rides_outputs(athlete, views, today)
+        recent_rides_cache.put(key, outputs)
+    return outputs
+
+
+# Everything the Distance and Time and CTL tabs draw, sent once per data
+# version; date-range changes are handled by the clientside callbacks below
 @app.callback(
+    Output("client-series", "data"),
+    Input("data-version", "data"),
+    State("athlete", "value"),
+)
+@stage_timer.timed("callback.update_client_series")
+def update_client_series(version, athlete_id):
+    athlete = registry.get(athlete_id)
+    views = registry.views(athlete.id)
+    if "daily_df" not in views:
+        return None
+    key = version_key(athlete, views)
+    series = client_series_cache.get(key)
+    if series is None:
+        series = build_client_series(athlete, views)
+        client_series_cache.put(key, series)
+    return series
+
+
+# Distance and Time tab (assets/clientside.js)
+app.clientside_callback(
+    ClientsideFunction(namespace="cycling", function_name="distance_figures"),
     [
-        Output("annual-distance-plot", "children"),
-        Output("monthly-distance-plot", "children"),
-        Output("weekly-totals-plot", "children"),
+        Output("annual-distance-plot", "figure"),
+        Output("monthly-distance-plot", "figure"),
+        Output("weekly-totals-plot", "figure"),
     ],
     [
         Input("distance-date-range", "start_date"),
         Input("distance-date-range", "end_date"),
+        Input("client-series", "data"),
     ],
 )
-def update_distance_time_plots(start_date, end_date):
-    try:
-        # Create new date range dataframe for the selected period
-        date_range = data_processor.create_future_dates_df(start_date, end_date)
-        merged_df = data_processor.merge_dataframes(date_range, all_data_df)
-
-        print(f"Distance Time Tab: Processing data for {start_date} to {end_date}")
-        print(f"Data shape: {merged_df.shape}")
-
-        # Check if we have any data
-        if merged_df.empty:
-            print("No data available for the selected date range")
-            empty_fig = go.Figure()
-            empty_fig.add_annotation(
-                text="No data available for the selected date range",
-                xref="paper",
-                yref="paper",
-                x=0.5,
-                y=0.5,
-                showarrow=False,
-            )
-            return (
-                dcc.Graph(figure=empty_fig),
-                dcc.Graph(figure=empty_fig),
-                dcc.Graph(figure=empty_fig),
-            )
-
-        # Create visualizations
-        print("Creating annual data...")
-        annual_data = data_processor.get_annual_data(merged_df)
-        print(f"Annual data shape: {annual_data.shape}")
 
-        print("Creating monthly data...")
-        monthly_data = data_processor.get_monthly_data(merged_df)
-        print(f"Monthly data shape: {monthly_data.shape}")
-
-        print("Creating weekly data...")
-        weekly_data = data_processor.get_weekly_totals(merged_df)
-        print(f"Weekly data shape: {weekly_data.shape}")
-
-        annual_plot = visualizer.create_annual_distance_plot(annual_data)
-        monthly_plot = visualizer.create_monthly_distance_plot(monthly_data)
-        weekly_plot = visualizer.create_weekly_totals_plot(weekly_data)
-
-        return (
-            dcc.Graph(figure=annual_plot),
-            dcc.Graph(figure=monthly_plot),
-            dcc.Graph(figure=weekly_plot),
-        )
-    except Exception as e:
-        import traceback
-
-        print(f"Error in update_distance_time_plots: {str(e)}")
-        print(traceback.format_exc())
-        empty_fig = go.Figure()
-        empty_fig.add_annotation(
-            text=f"Error loading data: {str(e)}",
-            xref="paper",
-            yref="paper",
-            x=0.5,
-            y=0.5,
-            showarrow=False,
-        )
-        return (
-            dcc.Graph(figure=empty_fig),
-            dcc.Graph(figure=empty_fig),
-            dcc.Graph(figure=empty_fig),
-        )
+# Chronic Training Load tab; zooming the CTL graph re-renders the visible
+# window at full resolution (assets/clientside.js)
+app.clientside_callback(
+    ClientsideFunction(namespace="cycling", function_name="ctl_figures"),
+    [Output("ctl-graph", "figure"), Output("monthly-tss-graph", "figure")],
+    [
+        Input("ctl-date-range", "start_date"),
+        Input("ctl-date-range", "end_date"),
+        Input("ctl-graph", "relayoutData"),
+        Input("client-series", "data"),
+    ],
+)
 
 
-# Callback for Chronic Training Load tab
+# Callback for Power Curve tab
 @app.callback(
-    [Output("ctl-graph", "children"), Output("monthly-tss-graph", "children")],
-    [Input("ctl-date-range", "start_date"), Input("ctl-date-range", "end_date")],
+    Output("power-curve-graph", "children"),
+    [
+        Input("power-curve-date-range", "start_date"),
+        Input("power-curve-date-range", "end_date"),
+        Input("data-version", "data"),
+    ],
+    State("athlete", "value"),
 )
-def update_ctl_graph(start_date, end_date):
+@stage_timer.timed("callback.update_power_curve")
+def update_power_curve(start_date, end_date, version, athlete_id):
     try:
-        # Create new date range dataframe for the selected period
-        date_range = data_processor.create_future_dates_df(start_date, end_date)
-        merged_df = data_processor.merge_dataframes(date_range, all_data_df)
-
-        # Check if we have any data
-        if merged_df.empty:
-            empty_fig = go.Figure()
-            empty_fig.add_annotation(
-                text="No data available for the selected date range",
-                xref="paper",
-                yref="paper",
-                x=0.5,
-                y=0.5,
-                showarrow=False,
-            )
-            return dcc.Graph(figure=empty_fig), dcc.Graph(figure=empty_fig)
-
-        # Create the CTL graph
-        ctl_plot = visualizer.create_ctl_graph(merged_df, start_date, end_date)
-
-        # Create monthly data for TSS visualization
-        monthly_data = data_processor.get_monthly_data(merged_df)
-
-        # Make sure we have the TSS data in the monthly aggregation
-        if "training_stress_score" in merged_df.columns:
-            # Sum up TSS by month if it's not already included
-            if "training_stress_score" not in monthly_data.columns:
-                tss_by_month = (
-                    merged_df.groupby("yrmo")["training_stress_score"]
-                    .sum()
-                    .reset_index()
-                )
-                # Merge with the monthly_data DataFrame
-                monthly_data = monthly_data.merge(tss_by_month, on="yrmo", how="left")
-
-        monthly_tss_plot = visualizer.create_monthly_tss_plot(monthly_data)
-
-        return dcc.Graph(figure=ctl_plot), dcc.Graph(figure=monthly_tss_plot)
+        power_curves = registry.get(athlete_id).power_curves
+        curves = {
+            f"{start_date} to {end_date}": power_curves.best_curve(
+                start_date, end_date
+            ),
+            "All Time": power_curves.best_curve(),
+        }
+        return dcc.Graph(figure=visualizer.create_power_curve_plot(curves))
     except Exception as e:
-        print(f"Error in update_ctl_graph: {str(e)}")
+        print(f"Error in update_power_curve: {str(e)}")
         empty_fig = go.Figure()
         empty_fig.add_annotation(
             text=f"Error loading data: {str(e)}",
@@ -284,11 +420,11 @@ def update_ctl_graph(start_date, end_date):
             y=0.5,
             showarrow=False,
         )
-        return dcc.Graph(figure=empty_fig), dcc.Graph(figure=empty_fig)
+        return dcc.Graph(figure=empty_fig)
 
 
 if __name__ == "__main__":
     # Only open browser in the main process, not the reloader process
     if not os.environ.get("WERKZEUG_RUN_MAIN"):
         Timer(1, open_browser).start()
-    app.run_server(debug=True, port=8050)
+    app.run_server(debug=DEBUG, port=8050)
@@ -0,0 +1,20 @@
+# Ingest process for multi-worker serving (see wsgi.py): ingests every
+# athlete, watches their download folders and publishes a snapshot of each
+# new data version for the workers to map
+import os
+import time
+
+from backend.SnapshotStore import SNAPSHOT_MODE_ENV
+
+os.environ[SNAPSHOT_MODE_ENV] = "publish"
+
+import main  # noqa: E402  (queues every athlete's ingest on import)
+
+if __name__ == "__main__":
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        main.ingest_queue.stop()
+        for watcher in main.folder_watchers.values():
+            watcher.stop()
@@ -0,0 +1,16 @@
+# WSGI entry point for serving with several worker processes, e.g.
+#
+#     python publisher.py &
+#     gunicorn -w 4 -b 127.0.0.1:8050 wsgi:application
+#
+# Workers don't ingest; they map the snapshots publisher.py writes. No browser
+# is opened and the debug reloader isn't involved.
+import os
+
+from backend.SnapshotStore import SNAPSHOT_MODE_ENV
+
+os.environ[SNAPSHOT_MODE_ENV] = "read"
+
+from main import app  # noqa: E402
+
+application = app.server